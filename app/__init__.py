@@ -3,19 +3,40 @@ from flask_login import LoginManager
 
 from config import settings
 from app.database import init_db
-from app.auth.models import User
-from app.database import session_scope
+from app.auth.services import load_user_identity
+from app.database import get_db_session, init_db_session, engine
+from app.async_database import init_async_reads
+from app.common.query_counter import init_query_counter
+from app.common.session_store import init_session_store
+from app.common.instrumentation import init_instrumentation
 
 from app.auth.auth_routes import user_blueprint
 from app.order.order_routes import order_blueprint
 from app.products.products_routes import products_blueprint
+from app.commands import commands_blueprint
+from app.monitoring import monitoring_blueprint
+from app.api.api_routes import api_blueprint
+from app.products.async_views import async_views as products_async_views
+from app.api.async_views import async_views as api_async_views
 
 app = Flask(__name__)
 
 app.config['SECRET_KEY'] = settings.SECRET_KEY
+app.config['QUERY_BUDGET_ASSERT'] = settings.QUERY_BUDGET_ASSERT
+init_query_counter(app, engine)
+init_db_session(app)
+init_session_store(app)
+init_instrumentation(app, engine)
+
 app.register_blueprint(user_blueprint)
 app.register_blueprint(order_blueprint)
 app.register_blueprint(products_blueprint)
+app.register_blueprint(commands_blueprint)
+app.register_blueprint(monitoring_blueprint)
+app.register_blueprint(api_blueprint)
+
+if settings.ASYNC_READS_ENABLED:
+    init_async_reads(app, {**products_async_views, **api_async_views})
 
 
 login_manager = LoginManager(app)
@@ -24,12 +45,7 @@ login_manager.login_message_category = 'warning'
 
 @login_manager.user_loader
 def load_user(user_id):
-    with session_scope() as session:
-        user = session.query(User).get(user_id)
-        if user:
-            session.expunge(user)
-
-        return user
+    return load_user_identity(get_db_session(), user_id)
 
 
 
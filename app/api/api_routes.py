@@ -0,0 +1,148 @@
+from flask import Blueprint, Response, abort, request
+from pydantic import ValidationError
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from config import SEARCH_PAGE_SIZE
+
+from app.database import session_scope
+from app.common.query_counter import query_budget
+from app.api.compression import compress_response
+from app.api.schemas import BookPageOut, SearchPageOut, BookOut, CartOut, CartUpdateIn, CartUpdateOut, \
+    OrderListOut, ErrorOut
+
+from app.products.services import search_books, get_catalog_page, count_catalog, get_book_availability
+from app.products.fragments import get_book_data
+from app.products.facets import parse_facet_filters
+from app.order.services import get_cart_items, calculate_total_price, get_orders, update_cart_batch
+
+"""
+Versioned JSON API for the mobile app: catalogue, book detail, search, cart and order history
+"""
+
+api_blueprint = Blueprint('api', __name__, url_prefix='/api/v1')
+api_blueprint.after_request(compress_response)
+
+
+def json_response(model, status: int = 200) -> Response:
+    """Serialize response schema to JSON"""
+    return Response(model.model_dump_json(), status=status, mimetype='application/json')
+
+
+@api_blueprint.errorhandler(HTTPException)
+def http_error(error):
+    """Errors as JSON instead of HTML pages"""
+    return json_response(ErrorOut(error=error.description), error.code)
+
+
+@api_blueprint.route('/books')
+@query_budget(4)
+def books():
+    """Catalogue page: ?category=&genre=&price=&year=&rating=&after=&before=&per_page=, keyset pagination by id"""
+
+    category = request.args.get('category')
+    genre = request.args.get('genre')
+
+    filters = parse_facet_filters(request.args)
+
+    with session_scope() as db_session:
+        page = get_catalog_page(db_session, category, genre,
+                                after=request.args.get('after', type=int),
+                                before=request.args.get('before', type=int),
+                                per_page=request.args.get('per_page', type=int),
+                                filters=filters)
+        total_count = count_catalog(db_session, category, genre, filters)
+
+    return json_response(BookPageOut(
+        items=page['books'],
+        next_cursor=page['next_cursor'],
+        prev_cursor=page['prev_cursor'],
+        per_page=page['per_page'],
+        total_count=total_count
+    ))
+
+
+@api_blueprint.route('/books/<int:book_id>')
+@query_budget(4)
+def book(book_id: int):
+    """Book detail with stock, quantity in cart and reviews, book data and reviews are cached"""
+
+    with session_scope() as db_session:
+        data = get_book_data(db_session, book_id)
+        if data is None:
+            abort(404, 'Book not found')
+
+        stock, qty_in_cart, _ = get_book_availability(db_session, book_id)
+
+    book_data, reviews = data
+    return json_response(BookOut(**book_data, stock=stock, qty_in_cart=qty_in_cart, reviews=reviews))
+
+
+@api_blueprint.route('/search')
+@query_budget(5)
+def search():
+    """Ranked search by title/author/description: ?q=&page="""
+
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    found = []
+
+    if query:
+        with session_scope() as db_session:
+            found = search_books(db_session, query,
+                                 limit=SEARCH_PAGE_SIZE + 1,
+                                 offset=(page - 1) * SEARCH_PAGE_SIZE)
+
+    return json_response(SearchPageOut(
+        query=query,
+        page=page,
+        has_next=len(found) > SEARCH_PAGE_SIZE,
+        items=found[:SEARCH_PAGE_SIZE]
+    ))
+
+
+@api_blueprint.route('/cart')
+@query_budget(2)
+def cart():
+    """Cart of current user, or guest cart from session"""
+
+    with session_scope() as db_session:
+        cart_items = get_cart_items(db_session)
+
+    return json_response(CartOut(items=cart_items, total_price=calculate_total_price(cart_items)))
+
+
+@api_blueprint.route('/cart', methods=['POST'])
+@query_budget(3)
+def update_cart():
+    """
+    Batch cart update in one round trip: {"items": {"<book_id>": qty, ...}, "mode": "add" | "set"}.
+    add changes quantities by qty (negative removes copies), set replaces them (0 removes the book).
+    Only application/json is accepted: cross-site forms can't send it without a CORS preflight
+    """
+    if not request.is_json:
+        abort(415, 'Content-Type must be application/json')
+
+    try:
+        changes = CartUpdateIn.model_validate_json(request.get_data())
+    except ValidationError as e:
+        abort(400, str(e))
+
+    with session_scope() as db_session:
+        result = update_cart_batch(db_session, changes.items, changes.mode)
+
+    return json_response(CartUpdateOut(**result._asdict()))
+
+
+@api_blueprint.route('/orders')
+@query_budget(2)
+def orders():
+    """Order history of current user: ?status="""
+
+    if not current_user.is_authenticated:
+        abort(401, 'Login required')
+
+    with session_scope() as db_session:
+        user_orders = get_orders(db_session, request.args.get('status'))
+
+    return json_response(OrderListOut(items=user_orders))
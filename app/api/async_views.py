@@ -0,0 +1,89 @@
+import asyncio
+
+from flask import abort, request
+
+from config import SEARCH_PAGE_SIZE
+
+from app.async_database import run_read
+from app.common.query_counter import query_budget
+from app.api.api_routes import json_response
+from app.api.schemas import BookPageOut, SearchPageOut, BookOut
+
+from app.products.services import search_books, get_book_availability, get_catalog_page, count_catalog
+from app.products.fragments import get_book_data_async
+from app.products.facets import parse_facet_filters
+
+"""
+Async versions of the read-only API endpoints, installed instead of the sync views
+of api_routes when ASYNC_READS_ENABLED is set (see init_async_reads)
+"""
+
+
+@query_budget(4)
+async def books():
+    """
+    Catalogue page: ?category=&genre=&price=&year=&rating=&after=&before=&per_page=, keyset pagination by id.
+    Page and count are queried concurrently
+    """
+
+    category = request.args.get('category')
+    genre = request.args.get('genre')
+    filters = parse_facet_filters(request.args)
+
+    page, total_count = await asyncio.gather(
+        run_read(get_catalog_page, category, genre,
+                 request.args.get('after', type=int),
+                 request.args.get('before', type=int),
+                 request.args.get('per_page', type=int),
+                 filters),
+        run_read(count_catalog, category, genre, filters),
+    )
+
+    return json_response(BookPageOut(
+        items=page['books'],
+        next_cursor=page['next_cursor'],
+        prev_cursor=page['prev_cursor'],
+        per_page=page['per_page'],
+        total_count=total_count
+    ))
+
+
+@query_budget(4)
+async def book(book_id: int):
+    """Book detail with stock, quantity in cart and reviews, book, reviews and stock are queried concurrently"""
+
+    data, (stock, qty_in_cart, _) = await asyncio.gather(
+        get_book_data_async(book_id),
+        run_read(get_book_availability, book_id),
+    )
+    if data is None:
+        abort(404, 'Book not found')
+
+    book_data, reviews = data
+    return json_response(BookOut(**book_data, stock=stock, qty_in_cart=qty_in_cart, reviews=reviews))
+
+
+@query_budget(5)
+async def search():
+    """Ranked search by title/author/description: ?q=&page="""
+
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    found = []
+
+    if query:
+        found = await run_read(search_books, query, SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE)
+
+    return json_response(SearchPageOut(
+        query=query,
+        page=page,
+        has_next=len(found) > SEARCH_PAGE_SIZE,
+        items=found[:SEARCH_PAGE_SIZE]
+    ))
+
+
+async_views = {
+    'api.books': books,
+    'api.book': book,
+    'api.search': search,
+}
@@ -0,0 +1,42 @@
+import gzip
+
+from flask import request
+
+from config import API_COMPRESS_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:  # optional dependency, gzip only
+    brotli = None
+
+"""
+Python file for response compression negotiated with Accept-Encoding (brotli if installed, gzip)
+"""
+
+ENCODINGS = ['br', 'gzip'] if brotli else ['gzip']
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress response body, levels favour speed over ratio"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=4)
+    return gzip.compress(data, compresslevel=5)
+
+
+def compress_response(response):
+    """after_request hook: compress responses above API_COMPRESS_MIN_SIZE bytes if client accepts it"""
+    response.vary.add('Accept-Encoding')
+
+    if (response.direct_passthrough
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or (response.content_length or 0) < API_COMPRESS_MIN_SIZE):
+        return response
+
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if not encoding:
+        return response
+
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
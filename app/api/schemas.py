@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict
+
+"""
+Python file for JSON API response schemas.
+Models validate straight from dicts / BookCard tuples and serialize with pydantic-core
+"""
+
+
+class Schema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BookCardOut(Schema):
+    id: int
+    title: str
+    author: str
+    price: float
+    cover: str | None
+    rating: float | None
+    year: int | None
+
+
+class BookPageOut(Schema):
+    items: list[BookCardOut]
+    next_cursor: int | None
+    prev_cursor: int | None
+    per_page: int
+    total_count: int
+
+
+class SearchPageOut(Schema):
+    query: str
+    page: int
+    has_next: bool
+    items: list[BookCardOut]
+
+
+class ReviewOut(Schema):
+    id: int
+    username: str | None
+    score: float | None
+    review: str | None
+    created_at: datetime | None
+
+
+class BookOut(BookCardOut):
+    description: str | None
+    genres: list[str]
+    stock: int
+    qty_in_cart: int
+    reviews: list[ReviewOut]
+
+
+class CartItemOut(Schema):
+    id: int
+    title: str
+    author: str
+    price: float
+    cover: str | None
+    quantity: int
+    total: float
+
+
+class CartOut(Schema):
+    items: list[CartItemOut]
+    total_price: float
+
+
+class CartUpdateIn(Schema):
+    items: dict[int, int]
+    mode: Literal['add', 'set'] = 'add'
+
+
+class CartUpdateOut(Schema):
+    quantities: dict[int, int]
+    not_found: list[int]
+    out_of_stock: list[int]
+
+
+class OrderOut(Schema):
+    id: int
+    created_at: datetime | None
+    status: str | None
+    total_price: float
+    items: list[CartItemOut]
+
+
+class OrderListOut(Schema):
+    items: list[OrderOut]
+
+
+class ErrorOut(Schema):
+    error: str
@@ -0,0 +1,183 @@
+import asyncio
+import os
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from contextvars import copy_context
+from functools import wraps
+from threading import Lock, Thread
+
+from sqlalchemy import event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import NullPool
+
+from config import settings
+
+"""
+Python file for the async read path: AsyncSession over asyncpg / psycopg3 / aiosqlite.
+Used by read-only views only, writes stay on the sync session (app.database).
+Async views of a worker process run on one long-lived event loop (a daemon thread),
+so connections of the async engine are pooled across requests
+"""
+
+ASYNC_DRIVERS = {
+    'postgresql': 'asyncpg',
+    'sqlite': 'aiosqlite',
+}
+
+_engine = None
+_sessionmaker = None
+
+_loop = None
+_loop_pid = None
+_loop_lock = Lock()
+
+
+def async_database_url(database_url: str) -> URL:
+    """
+    DATABASE_URL with the async driver of its backend:
+    postgresql(+psycopg2) -> postgresql+asyncpg, sqlite -> sqlite+aiosqlite,
+    postgresql+psycopg (psycopg3) is async-capable and kept as is
+    """
+    url = make_url(database_url)
+    if url.get_driver_name() == 'psycopg':
+        return url
+    return url.set(drivername=f'{url.get_backend_name()}+{ASYNC_DRIVERS[url.get_backend_name()]}')
+
+
+def async_engine_options(url: URL) -> dict:
+    """
+    create_async_engine() keyword arguments from settings, same as engine_options of the sync engine:
+    pool sized by DB_POOL_* for PostgreSQL, NullPool and no prepared statements in PgBouncer mode
+    """
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    if settings.DB_PGBOUNCER:
+        options = {'poolclass': NullPool}
+        if url.get_driver_name() == 'asyncpg':
+            options['connect_args'] = {'statement_cache_size': 0, 'prepared_statement_cache_size': 0}
+        elif url.get_driver_name() == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    return {
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
+
+
+def configure_async_engine(database_url: str | None = None, **options):
+    """
+    (Re)create the async engine of this process
+    :param database_url: async database url, default: ASYNC_DATABASE_URL or DATABASE_URL with the async driver
+    :param options: create_async_engine() arguments, override async_engine_options
+    """
+    global _engine, _sessionmaker
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    url = make_url(database_url or settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL))
+    _engine = create_async_engine(url, **{**async_engine_options(url), **options})
+    _sessionmaker = async_sessionmaker(_engine, expire_on_commit=False)
+    return _engine
+
+
+def get_async_engine():
+    """Async engine of this process, created on first use"""
+    if _engine is None:
+        configure_async_engine()
+    return _engine
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop of this process, running forever in a daemon thread.
+    Started on first use, so every (forked) worker process starts its own
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            Thread(target=_loop.run_forever, name='async-reads', daemon=True).start()
+    return _loop
+
+
+def run_coroutine(coro):
+    """
+    Run coro on the process event loop and wait for its result.
+    The coroutine sees the caller's context variables, i.e. Flask request and app context
+    """
+    future = Future()
+
+    def done(task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def start():
+        # created in the caller's context (see call_soon_threadsafe below), tasks copy the current context
+        asyncio.ensure_future(coro).add_done_callback(done)
+
+    get_event_loop().call_soon_threadsafe(start, context=copy_context())
+    return future.result()
+
+
+def async_to_sync(func):
+    """Flask.async_to_sync replacement: async views run on the process event loop instead of a new one"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_coroutine(func(*args, **kwargs))
+    return wrapper
+
+
+@asynccontextmanager
+async def async_session_scope():
+    """Read-only AsyncSession, rolled back and closed on exit"""
+    get_async_engine()
+    async with _sessionmaker() as session:
+        yield session
+
+
+async def run_read(fn, *args):
+    """
+    Run a sync read function fn(db_session, *args) of the services modules on its own AsyncSession.
+    Queries go through the async driver, so several run_read() can be awaited concurrently
+    with asyncio.gather, each on its own connection
+    :returns fn result, should be plain data (dicts, BookCards), session is closed afterwards
+    """
+    async with async_session_scope() as session:
+        return await session.run_sync(fn, *args)
+
+
+def init_async_reads(app, views: dict):
+    """
+    Replace sync views of read endpoints with their async versions, URL rules and endpoints stay the same.
+    Async views run on the process event loop, the worker thread waits for them.
+    The user is loaded on the worker thread, so the sync session never blocks the loop.
+    Query counter and instrumentation listen to the async engine as well
+    :param views: {endpoint: async view function}
+    """
+    from flask import request
+    from flask_login import current_user
+
+    from app.common.query_counter import record_statement
+    from app.common.instrumentation import instrument_engine
+
+    engine = get_async_engine()
+    event.listen(engine.sync_engine, 'before_cursor_execute', record_statement)
+    if settings.INSTRUMENTATION_ENABLED:
+        instrument_engine(engine.sync_engine)
+
+    app.async_to_sync = async_to_sync
+    app.view_functions.update(views)
+
+    @app.before_request
+    def load_user_before_async_view():
+        if request.endpoint in views:
+            current_user.is_authenticated
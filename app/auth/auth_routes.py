@@ -1,8 +1,11 @@
 from flask import flash, redirect, render_template, url_for, request, Blueprint
 from flask_login import current_user, login_required, login_user, logout_user
 
-from app.database import session_scope
+from app.database import session_scope, on_commit
+from app.common.query_counter import query_budget
 from app.auth.models import User
+from app.auth.services import invalidate_user
+from app.order.services import merge_guest_cart
 from app.auth.forms import RegistrationForm, VerificationForm, ChangePasswordForm, EditForm, LoginForm
 
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -22,16 +25,14 @@ def register():
     if form.validate_on_submit():
         with session_scope() as session:
             user = session.query(User).filter_by(email=form.email.data).first()
-        if user:
-            flash('User with this email already exists!', category='danger')
-            return  render_template('auth/register.html', form=form)
-
-        user = User(username=form.username.data,
-                    email=form.email.data,
-                    phone=form.phone.data,
-                    password_hash=generate_password_hash(form.password.data))
-
-        with session_scope() as session:
+            if user:
+                flash('User with this email already exists!', category='danger')
+                return  render_template('auth/register.html', form=form)
+
+            user = User(username=form.username.data,
+                        email=form.email.data,
+                        phone=form.phone.data,
+                        password_hash=generate_password_hash(form.password.data))
             session.add(user)
 
         flash('Registration successful! Please verify your phone.', 'success')
@@ -106,6 +107,8 @@ def login():
                 return render_template('auth/login.html', form=form)
 
             login_user(user)
+            if merge_guest_cart(session, user.id):
+                flash('Books from your cart were saved to your account.', 'info')
             flash('You are successfully logged in!', 'success')
             return redirect(url_for('products.home'))
 
@@ -119,6 +122,7 @@ def logout():
     return redirect(url_for('auth.login'))
 
 @user_blueprint.route('/account')
+@query_budget(1)
 @login_required
 def account():
     """Account page: shows auth information"""
@@ -136,11 +140,11 @@ def edit_account():
     user = current_user
 
     if form.validate_on_submit():
-        user.email = form.email.data
-        user.phone = form.phone.data
-
         with session_scope() as session:
-            session.add(user)
+            db_user = session.get(User, current_user.id)
+            db_user.email = form.email.data
+            db_user.phone = form.phone.data
+            on_commit(session, lambda: invalidate_user(db_user.id))
 
         flash('Update successful!', 'success')
         return redirect(url_for('auth.account'))
@@ -163,17 +167,20 @@ def change_password():
         new_pw = password_form.new_password.data
         confirm_pw = password_form.confirm_new_password.data
 
-        if not check_password_hash(user.password_hash, current_pw):
+        with session_scope() as session:
+            db_user = session.get(User, current_user.id)
+
+        if not check_password_hash(db_user.password_hash, current_pw):
             flash('Current password is incorrect.', 'danger')
         elif new_pw != confirm_pw:
             flash('New password and confirmation do not match.', 'danger')
         else:
-            user.password_hash = generate_password_hash(new_pw)
             with session_scope() as session:
-                session.add(user)
+                db_user.password_hash = generate_password_hash(new_pw)
+                on_commit(session, lambda: invalidate_user(db_user.id))
             flash('Password successfully changed!', 'success')
             return redirect(url_for('auth.verify_phone',
                                     next=url_for('auth.account')))
 
-    return render_template('auth/edit_account.html', user=user,
+    return render_template('auth/edit_account.html', user=user, form=EditForm(),
                            password_form=password_form, change_password=True)
\ No newline at end of file
@@ -24,5 +24,5 @@ class EditForm(FlaskForm):
 class ChangePasswordForm(FlaskForm):
     current_password = PasswordField('Password', validators=[InputRequired(), Length(8, 36)])
     new_password = PasswordField('Password', validators=[InputRequired(), Length(8, 36)])
-    confirm_new_password = PasswordField('Confirm Password', validators=[InputRequired(), EqualTo("password")])
+    confirm_new_password = PasswordField('Confirm Password', validators=[InputRequired(), EqualTo("new_password")])
 
@@ -0,0 +1,71 @@
+import json
+from dataclasses import dataclass, asdict
+
+from flask_login import UserMixin
+
+from app.auth.models import User
+from app.common.cache import TTLCache, connect_shared_store
+from config import settings, USER_CACHE_LOCAL_TTL
+
+"""
+Python file for auth supporting functions: cached user identity for flask_login
+"""
+
+
+@dataclass(frozen=True)
+class UserIdentity(UserMixin):
+    """Slim immutable user record used as current_user, no password hash"""
+    id: int
+    username: str | None
+    email: str | None
+    phone: str | None
+
+
+USER_CACHE_KEY = 'user:{}'
+
+_shared_store = connect_shared_store(settings.USER_CACHE_URL) if settings.USER_CACHE_URL else None
+# invalidate_user() can't drop local copies of other workers, keep them short-lived
+_local_cache = TTLCache(ttl=min(settings.USER_CACHE_TTL, USER_CACHE_LOCAL_TTL), maxsize=settings.USER_CACHE_SIZE)
+
+
+def user_to_identity(user: User) -> UserIdentity:
+    """Convert User model into UserIdentity"""
+    return UserIdentity(id=user.id, username=user.username, email=user.email, phone=user.phone)
+
+
+def load_user_identity(db_session, user_id) -> UserIdentity | None:
+    """
+    Get user identity by id: local LRU cache -> shared cache (if USER_CACHE_URL is set) -> database
+    :param db_session: database session, used on cache miss only
+    :param user_id: id from flask_login session cookie
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    identity = _local_cache.get(user_id)
+    if identity is not None:
+        return identity
+
+    key = USER_CACHE_KEY.format(user_id)
+    cached = _shared_store.get(key) if _shared_store is not None else None
+    if cached is not None:
+        identity = UserIdentity(**json.loads(cached))
+    else:
+        user = db_session.get(User, user_id)
+        if not user:
+            return None
+        identity = user_to_identity(user)
+        if _shared_store is not None:
+            _shared_store.set(key, json.dumps(asdict(identity)), ex=settings.USER_CACHE_TTL)
+
+    _local_cache.set(user_id, identity)
+    return identity
+
+
+def invalidate_user(user_id: int):
+    """Drop cached user identity after the user's data was changed"""
+    _local_cache.invalidate(user_id)
+    if _shared_store is not None:
+        _shared_store.delete(USER_CACHE_KEY.format(user_id))
@@ -0,0 +1,92 @@
+import click
+from flask import Blueprint
+
+from app.database import session_scope, engine
+
+"""
+Python file for maintenance flask CLI commands
+Usage: flask <command>
+"""
+
+commands_blueprint = Blueprint('commands', __name__, cli_group=None)
+
+
+@commands_blueprint.cli.command('rebuild_leaderboard')
+def rebuild_leaderboard():
+    """Recalculate top books leaderboard (book_sales) from order history"""
+    from app.order.services import rebuild_book_sales
+
+    with session_scope() as db_session:
+        books_count = rebuild_book_sales(db_session)
+
+    click.echo(f'leaderboard rebuilt: {books_count} books')
+
+
+@commands_blueprint.cli.command('rebuild_ratings')
+def rebuild_ratings():
+    """Recalculate products rating_sum / rating_count / rating from reviews"""
+    from app.products.services import rebuild_ratings as rebuild
+
+    from app.products.fragments import bump_book_version
+
+    with session_scope() as db_session:
+        books_count = rebuild(db_session)
+    bump_book_version()
+
+    click.echo(f'ratings rebuilt: {books_count} books')
+
+
+@commands_blueprint.cli.command('import_catalog')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False), default='book_catalog_sample.csv')
+@click.option('--chunk-size', default=5000, show_default=True, help='rows per transaction')
+@click.option('--qty', default=3, show_default=True, help='stock quantity for every imported book')
+@click.option('--restart', is_flag=True, help='ignore saved progress and import the whole file again')
+def import_catalog(path, chunk_size, qty, restart):
+    """Stream catalogue CSV into database, resumes an interrupted import of the same file"""
+    from app.products.catalog_import import import_catalog as run_import
+
+    imported = run_import(engine, path, chunk_size=chunk_size, quantity=qty,
+                          restart=restart, progress=click.echo)
+    click.echo(f'products added: {imported}')
+
+
+@commands_blueprint.cli.command('sync_catalog')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='rows per transaction')
+def sync_catalog(path, batch_size):
+    """Apply supplier feed (CSV with sku column): upsert only new/changed books and stock"""
+    from app.products.catalog_sync import sync_catalog as run_sync
+
+    stats = run_sync(engine, path, batch_size=batch_size, progress=click.echo)
+    click.echo(f'catalogue synced: {stats}')
+
+
+@commands_blueprint.cli.command('purge_sessions')
+def purge_sessions():
+    """Delete expired sessions of a file:// SESSION_STORE_URL (redis expires them itself)"""
+    from app.common.session_store import connect_session_store
+    from app.common.cache import FileKeyValueStore
+    from config import settings
+
+    store = connect_session_store(settings.SESSION_STORE_URL) if settings.SESSION_STORE_URL else None
+    if not isinstance(store, FileKeyValueStore):
+        click.echo('SESSION_STORE_URL is not a file:// store, nothing to purge')
+        return
+
+    click.echo(f'expired sessions deleted: {store.purge_expired()}')
+
+
+@commands_blueprint.cli.command('check_query_plans')
+def check_query_plans():
+    """EXPLAIN hot queries, exit with error if any of them scans a whole table"""
+    from app.common.query_plans import check_query_plans as run_check
+
+    failed = 0
+    for name, uses_index, plan in run_check(engine):
+        click.echo(f'{"ok" if uses_index else "FULL SCAN"}: {name}')
+        if not uses_index:
+            failed += 1
+            click.echo('\n'.join(f'    {line}' for line in plan))
+
+    if failed:
+        raise SystemExit(1)
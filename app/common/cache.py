@@ -0,0 +1,218 @@
+"""
+Python file for in-process caching helpers shared by several modules
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache.
+    Entries expire after {ttl} seconds, the least recently used entry is evicted
+    once {maxsize} is exceeded
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """Get cached value or {default} if key is missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value for key, evict the oldest entries above maxsize"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        """
+        Get cached value, or compute it with factory() and store it
+        :param key: cache key
+        :param factory: callable without arguments, called on cache miss
+        """
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    async def get_or_set_async(self, key, factory):
+        """
+        get_or_set for coroutines
+        :param factory: coroutine function without arguments, awaited on cache miss
+        """
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = await factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or the whole cache if key is None"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+class LocalKeyValueStore:
+    """
+    In-process stand-in for a shared Redis-compatible store (get / set with ex / incr / delete).
+    Used when no shared backend is configured, e.g. in development and single-process setups
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ex: int | None = None):
+        with self._lock:
+            expires_at = time.monotonic() + ex if ex is not None else None
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return True
+
+    def incr(self, key, amount: int = 1) -> int:
+        with self._lock:
+            expires_at, value = self._data.get(key, (None, 0))
+            if expires_at is not None and expires_at < time.monotonic():
+                expires_at, value = None, 0
+            value = int(value) + amount
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+class FileKeyValueStore:
+    """
+    Filesystem store with the same interface as LocalKeyValueStore,
+    shared by all worker processes on one host. One file per key, written atomically.
+    Files of expired keys are deleted when read, and by purge_expired() every {purge_interval} seconds
+    """
+
+    def __init__(self, directory: str, purge_interval: float = 3600):
+        self.directory = directory
+        self.purge_interval = purge_interval
+        self._purged_at = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key) -> str:
+        return os.path.join(self.directory, hashlib.sha1(str(key).encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, _, value = f.read().partition(b'\n')
+        except FileNotFoundError:
+            return None
+
+        if expires_at and float(expires_at) < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ex: int | None = None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        expires_at = str(time.time() + ex).encode() if ex is not None else b''
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(expires_at + b'\n' + value)
+        os.replace(tmp_path, self._path(key))
+
+        if time.time() - self._purged_at >= self.purge_interval:
+            self.purge_expired()
+        return True
+
+    def purge_expired(self) -> int:
+        """
+        Delete files of expired keys, e.g. sessions that were never used again
+        :returns number of deleted files
+        """
+        self._purged_at = now = time.time()
+        purged = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('tmp'):  # being written by set()
+                continue
+            try:
+                with open(entry.path, 'rb') as f:
+                    expires_at = f.readline().strip()
+                if expires_at and float(expires_at) < now:
+                    os.remove(entry.path)
+                    purged += 1
+            except (FileNotFoundError, ValueError):
+                pass
+        return purged
+
+    def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+
+def connect_shared_store(url: str | None):
+    """
+    Shared key-value store for caches used by several worker processes.
+    url: redis://... (requires the optional `redis` package), None -> LocalKeyValueStore
+    """
+    if not url:
+        return LocalKeyValueStore()
+
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError('Shared cache url is set, but the `redis` package is not installed') from e
+
+    return redis.Redis.from_url(url)
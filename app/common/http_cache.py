@@ -0,0 +1,96 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import make_response, request, session as flask_session
+from flask.globals import request_ctx
+from flask_login import current_user
+
+"""
+Python file for conditional HTTP responses: ETag / Last-Modified, 304 Not Modified, Cache-Control
+"""
+
+
+def make_etag(*parts) -> str:
+    """Short hash of page data versions, used as weak ETag"""
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def is_not_modified(etag: str, last_modified: datetime | None = None) -> bool:
+    """
+    Check request validators against current page version.
+    If-None-Match wins over If-Modified-Since, pages with pending flash messages are always rendered
+    """
+    if '_flashes' in flask_session:
+        return False
+
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    if last_modified is not None and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+
+    return False
+
+
+def has_flashes() -> bool:
+    """Flash messages are pending, or were shown by the rendered page (get_flashed_messages keeps them on request)"""
+    return '_flashes' in flask_session or bool(getattr(request_ctx, 'flashes', None))
+
+
+PageValidators = namedtuple('PageValidators', ['etag', 'last_modified', 'public', 'not_modified'])
+
+
+def get_page_validators(etag_parts: tuple, last_modified: datetime | None, max_age: int) -> PageValidators:
+    """ETag, Last-Modified and cacheability of a page for current user, and whether client's copy is current"""
+    public = not current_user.is_authenticated and max_age > 0
+    etag = make_etag(current_user.is_authenticated, *etag_parts)
+    if not public:
+        last_modified = None
+
+    return PageValidators(etag, last_modified, public, is_not_modified(etag, last_modified))
+
+
+def make_conditional_response(body, validators: PageValidators, max_age: int):
+    """Response with page body (or 304) and validator / Cache-Control headers"""
+    response = make_response('', 304) if validators.not_modified else make_response(body)
+
+    response.set_etag(validators.etag, weak=True)
+    if validators.last_modified is not None:
+        response.last_modified = validators.last_modified.replace(tzinfo=timezone.utc)
+
+    if has_flashes():
+        # one-off messages must be neither replayed from a cache nor hidden by a cached copy
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+    elif validators.public:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+
+    return response
+
+
+def conditional_response(render, etag_parts: tuple, last_modified: datetime | None = None, max_age: int = 0):
+    """
+    Return 304 Not Modified if client's copy is current, otherwise render the page.
+    Pages for anonymous users are public for {max_age} seconds, pages for logged-in users are private
+    and revalidated on every view, pages with flash messages are not stored at all
+    :param render: callable without arguments returning page body, called only if page changed
+    :param etag_parts: versions of all data shown on the page
+    :param last_modified: naive UTC time of the last data change, sent to anonymous users only
+    :param max_age: seconds a shared cache or browser may reuse the page without revalidation
+    """
+    validators = get_page_validators(etag_parts, last_modified, max_age)
+    body = None if validators.not_modified else render()
+    return make_conditional_response(body, validators, max_age)
+
+
+async def conditional_response_async(render, etag_parts: tuple, last_modified: datetime | None = None,
+                                     max_age: int = 0):
+    """conditional_response for async views, render is a coroutine function awaited only if page changed"""
+    validators = get_page_validators(etag_parts, last_modified, max_age)
+    body = None if validators.not_modified else await render()
+    return make_conditional_response(body, validators, max_age)
@@ -0,0 +1,251 @@
+import cProfile
+import os
+import random
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+
+from flask import before_render_template, request, template_rendered
+from sqlalchemy import event
+
+from config import settings
+
+"""
+Python file for opt-in per-request instrumentation:
+time spent in SQL, Jinja rendering, session load/save and the rest of the app code.
+Timings are sent in Server-Timing header, aggregated into histograms for /metrics,
+and a sample of requests can be profiled with cProfile (or pyinstrument, if installed)
+"""
+
+PHASES = ('db', 'render', 'session', 'app', 'total')
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Phase durations (seconds) and SQL query count of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.endpoint = None
+        self.render_started = []
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+
+    def finish(self):
+        self.phases['total'] = time.perf_counter() - self.started
+        self.phases['app'] = max(0.0, self.phases['total'] - self.phases['db']
+                                 - self.phases['render'] - self.phases['session'])
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        parts = []
+        for phase in PHASES:
+            part = f'{phase};dur={self.phases[phase] * 1000:.2f}'
+            if phase == 'db':
+                part += f';desc="{self.queries} queries"'
+            parts.append(part)
+        return ', '.join(parts)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with labels, thread-safe"""
+
+    def __init__(self, name: str, description: str, buckets: tuple, labels: tuple):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        """Lines of Prometheus text exposition format"""
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+phase_histogram = Histogram('bookstore_request_phase_seconds', 'Request time by endpoint and phase',
+                            LATENCY_BUCKETS, ('endpoint', 'phase'))
+query_histogram = Histogram('bookstore_request_queries', 'SQL queries per request by endpoint',
+                            QUERY_BUCKETS, ('endpoint',))
+
+
+def render_gauges(prefix: str, values: dict) -> list[str]:
+    """Numeric values of a dict as Prometheus gauges"""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, (int, float)):
+            lines += [f'# TYPE {prefix}_{key} gauge', f'{prefix}_{key} {value}']
+    return lines
+
+
+def get_metrics_text(pool_metrics: dict) -> str:
+    """Aggregated histograms and connection pool state of this worker process, Prometheus text format"""
+    lines = phase_histogram.render() + query_histogram.render() + render_gauges('bookstore_db_pool', pool_metrics)
+    return '\n'.join(lines) + '\n'
+
+
+class InstrumentationMiddleware:
+    """
+    WSGI middleware: collects RequestTimings for every request, adds Server-Timing header,
+    records histograms and profiles a {PROFILE_SAMPLE_RATE} share of requests
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        def timed_start_response(status, headers, exc_info=None):
+            timings.finish()
+            headers.append(('Server-Timing', timings.server_timing()))
+            record(timings)
+            return start_response(status, headers, exc_info)
+
+        try:
+            if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+                return profile(self.wsgi_app, environ, timed_start_response)
+            return self.wsgi_app(environ, timed_start_response)
+        finally:
+            _current.reset(token)
+
+
+def record(timings: RequestTimings):
+    endpoint = timings.endpoint or 'unknown'
+    for phase, seconds in timings.phases.items():
+        phase_histogram.observe(seconds, endpoint, phase)
+    query_histogram.observe(timings.queries, endpoint)
+
+
+def profile(wsgi_app, environ, start_response):
+    """Run request under profiler and dump the profile to PROFILE_DIR"""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = environ.get('PATH_INFO', '').strip('/').replace('/', '_')
+    name = os.path.join(settings.PROFILE_DIR, f'{time.time():.6f}-{path}')
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:  # optional dependency, cProfile output
+        profiler = cProfile.Profile()
+        result = profiler.runcall(wsgi_app, environ, start_response)
+        profiler.dump_stats(name + '.prof')
+        return result
+
+    profiler = Profiler()
+    profiler.start()
+    try:
+        return wsgi_app(environ, start_response)
+    finally:
+        profiler.stop()
+        with open(name + '.html', 'w') as f:
+            f.write(profiler.output_html())
+
+
+class TimedSessionInterface:
+    """Wraps app session interface, time of open_session / save_session goes to session phase"""
+
+    def __init__(self, interface):
+        self.interface = interface
+
+    def __getattr__(self, name):
+        return getattr(self.interface, name)
+
+    def open_session(self, app, request):
+        started = time.perf_counter()
+        try:
+            return self.interface.open_session(app, request)
+        finally:
+            add_phase('session', time.perf_counter() - started)
+
+    def save_session(self, app, session, response):
+        started = time.perf_counter()
+        try:
+            return self.interface.save_session(app, session, response)
+        finally:
+            add_phase('session', time.perf_counter() - started)
+
+
+def add_phase(phase: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    timings = _current.get()
+    if timings is not None and started is not None:
+        timings.add('db', time.perf_counter() - started)
+        timings.queries += 1
+
+
+def start_render(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None:
+        timings.render_started.append(time.perf_counter())
+
+
+def finish_render(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None and timings.render_started:
+        started = timings.render_started.pop()
+        # nested render_template calls are counted once, by the outermost one
+        if not timings.render_started:
+            timings.add('render', time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Count SQL time and queries of engine into the current request timings"""
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def init_instrumentation(app, engine):
+    """Install middleware and hooks if INSTRUMENTATION_ENABLED is set"""
+    if not settings.INSTRUMENTATION_ENABLED:
+        return
+
+    app.wsgi_app = InstrumentationMiddleware(app.wsgi_app)
+    app.session_interface = TimedSessionInterface(app.session_interface)
+
+    instrument_engine(engine)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(finish_render, app)
+
+    @app.before_request
+    def remember_endpoint():
+        timings = _current.get()
+        if timings is not None:
+            timings.endpoint = request.endpoint
@@ -0,0 +1,64 @@
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+"""
+Python file for SQL query instrumentation:
+records statements executed during a request and checks per-route query budgets
+"""
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in test mode when a route runs more queries than its budget"""
+
+
+def query_budget(max_queries: int):
+    """
+    Decorator for view functions: max number of SQL statements per request.
+    Place it below the route decorator, e.g.
+        @blueprint.route('/')
+        @query_budget(3)
+        def home(): ...
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    """SQLAlchemy before_cursor_execute listener: store statement for current request"""
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements.append(statement)
+
+
+def get_request_statements() -> list[str]:
+    """SQL statements executed so far in current request"""
+    return g.get('sql_statements', [])
+
+
+def init_query_counter(app, engine):
+    """
+    Count queries per request.
+    If app.testing or QUERY_BUDGET_ASSERT is set, exceeding a route budget raises QueryBudgetExceeded,
+    otherwise it is logged as a warning
+    """
+    event.listen(engine, 'before_cursor_execute', record_statement)
+
+    @app.before_request
+    def start_query_counter():
+        g.sql_statements = []
+
+    @app.after_request
+    def check_query_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        statements = get_request_statements()
+
+        if budget is not None and len(statements) > budget:
+            message = (f'{request.endpoint} ran {len(statements)} queries, budget is {budget}:\n'
+                       + '\n'.join(statements))
+            if app.testing or app.config.get('QUERY_BUDGET_ASSERT'):
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+
+        return response
@@ -0,0 +1,89 @@
+from sqlalchemy import text
+
+"""
+Python file for EXPLAIN-based checks that hot queries are served by indexes.
+Run with: flask check_query_plans
+"""
+
+# name -> (table that must not be scanned, query, params)
+HOT_QUERIES = {
+    'cart item by user and book': (
+        'cart_items',
+        'SELECT quantity FROM cart_items WHERE user_id = :user_id AND book_id = :book_id',
+        {'user_id': 1, 'book_id': 1},
+    ),
+    'order items of orders': (
+        'order_items',
+        'SELECT book_id, quantity FROM order_items WHERE order_id IN (:order_id)',
+        {'order_id': 1},
+    ),
+    'sales of a book': (
+        'order_items',
+        'SELECT SUM(quantity) FROM order_items WHERE book_id = :book_id',
+        {'book_id': 1},
+    ),
+    'order history by status': (
+        'orders',
+        'SELECT id FROM orders WHERE user_id = :user_id AND status = :status ORDER BY date DESC',
+        {'user_id': 1, 'status': 'active'},
+    ),
+    'reviews of a book': (
+        'reviews',
+        'SELECT id FROM reviews WHERE book_id = :book_id ORDER BY created_at DESC',
+        {'book_id': 1},
+    ),
+    'books of a genre': (
+        'book_genre',
+        'SELECT book_id FROM book_genre WHERE genre_id = :genre_id',
+        {'genre_id': 1},
+    ),
+}
+
+POSTGRES_HOT_QUERIES = {
+    'full-text search': (
+        'products',
+        "SELECT id FROM products WHERE "
+        "((setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple'::regconfig, coalesce(author, '')), 'B')) || "
+        "setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'C')) "
+        "@@ to_tsquery('simple'::regconfig, :query)",
+        {'query': 'book:*'},
+    ),
+}
+
+
+def explain(connection, query: str, params: dict) -> list[str]:
+    """Query plan lines"""
+    if connection.dialect.name == 'postgresql':
+        return [row[0] for row in connection.execute(text(f'EXPLAIN {query}'), params)]
+    return [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {query}'), params)]
+
+
+def is_full_scan(plan: list[str], table: str, dialect_name: str) -> bool:
+    """True if the plan reads the whole table instead of using an index"""
+    if dialect_name == 'postgresql':
+        return any(f'Seq Scan on {table}' in line for line in plan)
+    return any(line.startswith(f'SCAN {table}') and 'USING' not in line for line in plan)
+
+
+def check_query_plans(engine) -> list[tuple[str, bool, list[str]]]:
+    """
+    EXPLAIN every hot query.
+    On PostgreSQL sequential scans are disabled for the check, so small test tables
+    still show whether a usable index exists
+    :returns list of (query name, uses index, plan lines)
+    """
+    results = []
+    with engine.connect() as connection:
+        queries = dict(HOT_QUERIES)
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+            queries.update(POSTGRES_HOT_QUERIES)
+
+        for name, (table, query, params) in queries.items():
+            plan = explain(connection, query, params)
+            results.append((name, not is_full_scan(plan, table, connection.dialect.name), plan))
+
+        connection.rollback()
+
+    return results
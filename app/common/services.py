@@ -1,6 +1,24 @@
 """
 Python file for supporting functions shared by several modules
 """
+from collections import namedtuple
+
+from app.products.models import Book
+
+# Compact read model for listing pages (catalogue, search, top books):
+# only the columns cards show, no description/genres, no ORM identity map
+BookCard = namedtuple('BookCard', ['id', 'title', 'author', 'price', 'cover', 'rating', 'year'])
+
+
+def book_card_columns() -> tuple:
+    """Columns selected for BookCard, in the same order"""
+    return Book.id, Book.title, Book.author, Book.price, Book.cover, Book.rating, Book.year
+
+
+def to_book_cards(rows) -> list[BookCard]:
+    """Convert projected rows (see book_card_columns) to BookCard tuples"""
+    return [BookCard._make(row) for row in rows]
+
 
 def book_to_dict(book) -> dict:
     """
@@ -21,7 +39,7 @@ def book_to_dict(book) -> dict:
 def cart_item_to_dict(item, quantity=None) -> dict:
     """
     Convert cart query into a dict for UI
-    :param item: CartItem (auth) или Book (guest)
+    :param item: CartItem (auth), Book (guest) or a projected row with book columns (+ quantity)
     :param quantity: book quantity
     """
     book = item.book if hasattr(item, 'book') else item
@@ -72,7 +90,7 @@ def review_to_dict(item):
         'id': item.id,
         'book_id': item.book_id,
         'user_id': item.user_id,
-        'username': item.user.username if hasattr(item, 'auth') else 'Anonymous',
+        'username': item.user.username if item.user else 'Anonymous',
         'score': item.score,
         'review': item.review,
         'created_at': item.created_at
@@ -0,0 +1,139 @@
+import hashlib
+import secrets
+
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from flask_login import user_logged_in, user_logged_out
+from itsdangerous import BadSignature, Signer
+
+from app.common.cache import LocalKeyValueStore, FileKeyValueStore, connect_shared_store
+from config import settings
+
+"""
+Python file for server-side sessions: session data lives in a key-value store,
+the cookie only carries a signed session id
+"""
+
+SESSION_KEY = 'session:{}'
+
+
+class ServerSideSession(SecureCookieSession):
+    """Session dict with its id in the store"""
+
+    def __init__(self, initial=None, sid: str | None = None, new: bool = False):
+        super().__init__(initial)
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.new = new
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move session data to a new id, the old one is deleted on save. Call when privileges change"""
+        if self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface over a Redis-compatible store (get / set with ex / delete).
+    Session data is written only when it was changed
+    """
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt='server-side-session', key_derivation='hmac',
+                      digest_method=hashlib.sha256)
+
+    def open_session(self, app, request) -> ServerSideSession | None:
+        if not app.secret_key:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self.get_signer(app).unsign(cookie).decode('utf-8')
+            except BadSignature:
+                sid = None
+
+            data = self.store.get(SESSION_KEY.format(sid)) if sid else None
+            if data is not None:
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+                return self.session_class(self.serializer.loads(data), sid=sid)
+
+        return self.session_class(new=True)
+
+    def save_session(self, app, session: ServerSideSession, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        key = SESSION_KEY.format(session.sid)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.previous_sid is not None:
+            self.store.delete(SESSION_KEY.format(session.previous_sid))
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(key)
+                response.delete_cookie(name, domain=domain, path=path)
+                response.vary.add('Cookie')
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        self.store.set(key, self.serializer.dumps(dict(session)),
+                       ex=int(app.permanent_session_lifetime.total_seconds()))
+
+        response.set_cookie(
+            name,
+            self.get_signer(app).sign(session.sid.encode('utf-8')).decode('utf-8'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add('Cookie')
+
+
+def connect_session_store(url: str):
+    """
+    Session store by url:
+    local -> in-process dict (single process, development),
+    file:///path -> one file per session, shared by workers on one host,
+    redis://... -> shared redis (requires the optional `redis` package)
+    """
+    if url == 'local':
+        return LocalKeyValueStore(maxsize=settings.SESSION_STORE_SIZE)
+    if url.startswith('file://'):
+        return FileKeyValueStore(url[len('file://'):])
+    return connect_shared_store(url)
+
+
+def regenerate_session(sender, **extra):
+    """flask_login user_logged_in / user_logged_out receiver: a session id known before login is useless after it"""
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
+
+
+def init_session_store(app):
+    """
+    Use server-side sessions if SESSION_STORE_URL is set, signed cookie sessions otherwise.
+    Session id is regenerated on login and logout (session fixation)
+    """
+    if settings.SESSION_STORE_URL:
+        app.session_interface = ServerSideSessionInterface(connect_session_store(settings.SESSION_STORE_URL))
+        user_logged_in.connect(regenerate_session, app)
+        user_logged_out.connect(regenerate_session, app)
@@ -1,22 +1,232 @@
-from sqlalchemy import create_engine
+import os
+import time
+from threading import Lock, get_ident
+
+from flask import has_app_context, has_request_context
+from flask.globals import app_ctx
+
+from sqlalchemy import DateTime, create_engine, event, exc, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql import expression
 
 from sqlalchemy.ext.declarative import declarative_base
 
 from contextlib import contextmanager
 from config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = scoped_session(sessionmaker(autocommit=False, bind=engine),)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PoolMetrics:
+    """Counters of connection pool usage, shared by all the threads of a process"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool measuring how long requests wait for a free connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(database_url: str) -> dict:
+    """
+    create_engine() keyword arguments from settings:
+    QueuePool sized by DB_POOL_* for PostgreSQL, NullPool in PgBouncer mode
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    if settings.DB_PGBOUNCER:
+        # PgBouncer (transaction pooling) owns the pool: no client side pooling,
+        # no server side prepared statements, they don't survive connection switches
+        options = {'poolclass': NullPool}
+        if url.get_driver_name() == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    return {
+        'poolclass': MeteredQueuePool,
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+event.listen(engine, 'connect', lambda dbapi_connection, connection_record: pool_metrics.record_connect())
+
+
+def session_scope_id():
+    """One session per Flask app context (i.e. per request), per thread outside of Flask"""
+    if has_app_context():
+        return id(app_ctx._get_current_object())
+    return get_ident()
+
+
+SessionLocal = scoped_session(sessionmaker(autocommit=False, bind=engine), scopefunc=session_scope_id)
 
 Base = declarative_base()
 
+
+def get_pool_metrics() -> dict:
+    """
+    Current connection pool state and usage counters of this process.
+    checked_out + pool size + overflow help to size workers against Postgres max_connections
+    """
+    pool = engine.pool
+    metrics = {
+        'pool_class': type(pool).__name__,
+        'checkouts': pool_metrics.checkouts,
+        'connects': pool_metrics.connects,
+        'timeouts': pool_metrics.timeouts,
+        'wait_total_seconds': round(pool_metrics.wait_total, 6),
+        'wait_max_seconds': round(pool_metrics.wait_max, 6),
+    }
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            'pool_size': pool.size(),
+            'max_overflow': settings.DB_MAX_OVERFLOW,
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    return metrics
+
+
+class utc_now(expression.FunctionElement):
+    """
+    Current UTC time as naive timestamp, for server defaults of columns written with datetime.utcnow:
+    timezone('utc', now()) on PostgreSQL (now() is in the server's time zone), CURRENT_TIMESTAMP (UTC) elsewhere
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utc_now)
+def compile_utc_now(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utc_now, 'postgresql')
+def compile_utc_now_postgresql(element, compiler, **kw):
+    return "timezone('utc', now())"
+
+
+def dialect_insert(db_session, table):
+    """
+    Returns INSERT construct of the session's (or connection's) dialect,
+    so ON CONFLICT upserts work both on PostgreSQL and SQLite
+    """
+    dialect = db_session.dialect if hasattr(db_session, 'dialect') else db_session.get_bind().dialect
+    if dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """
+    Upgrade database schema to the latest alembic migration.
+    Databases created before migrations (by create_all) are stamped with the initial revision first
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_cfg = Config(os.path.join(PROJECT_ROOT, 'alembic.ini'))
+    alembic_cfg.attributes['configure_logger'] = False
+
+    tables = inspect(engine).get_table_names()
+    if 'products' in tables and 'alembic_version' not in tables:
+        command.stamp(alembic_cfg, '0001_initial')
+
+    command.upgrade(alembic_cfg, 'head')
+
+def get_db_session():
+    """Session of current request (app context), or of current thread outside of Flask"""
+    return SessionLocal()
+
+
+def on_commit(db_session, callback):
+    """
+    Run callback() once after db_session commits,
+    e.g. to invalidate caches only when the new data is visible to other requests
+    """
+    event.listen(db_session, 'after_commit', lambda session: callback(), once=True)
+
+
+def init_db_session(app):
+    """
+    Request-scoped unit of work: all session_scope() blocks of a request share one session,
+    it is committed once after the view, and removed (connection returned to pool) on app context teardown
+    """
+
+    @app.after_request
+    def commit_db_session(response):
+        if response.status_code < 400:
+            SessionLocal().commit()
+        return response
+
+    @app.teardown_appcontext
+    def remove_db_session(exception=None):
+        SessionLocal.remove()
+
 
 @contextmanager
 def session_scope():
+    """
+    Inside a request: yields the request session, changes are flushed here
+    and committed once at the end of request (see init_db_session); an error rolls the request session back.
+    Outside of a request (CLI, scripts): own transaction, committed on exit
+    """
     session = SessionLocal()
+
+    if has_request_context():
+        try:
+            yield session
+            session.flush()
+        except Exception:
+            session.rollback()
+            raise
+        return
+
     try:
         yield session
         session.commit()
@@ -0,0 +1,33 @@
+from flask import Blueprint, Response, abort, jsonify
+
+from app.database import get_pool_metrics
+from app.common.instrumentation import get_metrics_text
+from config import settings
+
+"""
+Python file for operational endpoints, enabled with METRICS_ENABLED setting
+"""
+
+monitoring_blueprint = Blueprint('monitoring', __name__)
+
+
+@monitoring_blueprint.before_request
+def check_enabled():
+    """Monitoring endpoints are hidden unless METRICS_ENABLED is set"""
+    if not settings.METRICS_ENABLED:
+        abort(404)
+
+
+@monitoring_blueprint.route('/metrics/pool')
+def pool_metrics():
+    """Connection pool state of this worker process: checked out connections, overflow, wait time"""
+    return jsonify(get_pool_metrics())
+
+
+@monitoring_blueprint.route('/metrics')
+def metrics():
+    """
+    Prometheus metrics of this worker process: request phase and query count histograms
+    (with INSTRUMENTATION_ENABLED) and connection pool gauges
+    """
+    return Response(get_metrics_text(get_pool_metrics()), mimetype='text/plain; version=0.0.4')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -8,6 +8,9 @@ from datetime import datetime
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_user_status_date', 'user_id', 'status', 'date'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(ForeignKey('users.id'))
@@ -22,8 +25,8 @@ class OrderItem(Base):
     __tablename__ = 'order_items'
 
     id = Column(Integer, primary_key=True)
-    order_id = Column(ForeignKey('orders.id'))
-    book_id = Column(ForeignKey('products.id'))
+    order_id = Column(ForeignKey('orders.id'), index=True)
+    book_id = Column(ForeignKey('products.id'), index=True)
 
     quantity = Column(Integer, nullable=False)
     price = Column(Integer, nullable=False)
@@ -34,6 +37,9 @@ class OrderItem(Base):
 
 class CartItem(Base):
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'book_id', name='uq_cart_items_user_book'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(ForeignKey('users.id'))
@@ -44,3 +50,11 @@ class CartItem(Base):
     book = relationship('Book')
 
 
+class BookSales(Base):
+    """Sales leaderboard: total sold copies per book, updated on every new order"""
+    __tablename__ = 'book_sales'
+
+    book_id = Column(ForeignKey('products.id'), primary_key=True)
+    sales_count = Column(Integer, nullable=False, default=0)
+
+    book = relationship('Book')
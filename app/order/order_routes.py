@@ -3,9 +3,10 @@ from flask_login import login_required
 from flask import session as flask_session
 
 from app.database import session_scope
+from app.common.query_counter import query_budget
 from app.order.forms import DeliveryForm, PaymentForm, AddressForm
 from app.order.services import get_cart_items, calculate_total_price, add_address, update_cart_quantity, \
-    get_orders, update_order_status, finalize_order
+    get_orders, update_order_status, finalize_order, get_items_for_quantities
 
 
 order_blueprint = Blueprint(
@@ -15,35 +16,42 @@ order_blueprint = Blueprint(
 )
 
 @order_blueprint.route('/add_to_cart/<int:book_id>', methods=['POST'])
+@query_budget(3)
 def add_to_cart(book_id):
     """Add to cart page: add book to cart table or flask session"""
 
-    success = update_cart_quantity(book_id, change=1)
+    with session_scope() as db_session:
+        success = update_cart_quantity(db_session, book_id, change=1)
     if success:
         flash("Book added to cart", "success")
     return redirect(request.referrer)
 
 
 @order_blueprint.route('/cart/remove/<int:book_id>', methods=['POST'])
+@query_budget(3)
 def remove_copy_from_cart(book_id: int):
     """Remove 1 copy of book from cart table or flask_session"""
 
-    success = update_cart_quantity(book_id, change=-1)
+    with session_scope() as db_session:
+        success = update_cart_quantity(db_session, book_id, change=-1)
     if success:
         flash("Book removed from cart", "warning")
     return redirect(request.referrer)
 
 
 @order_blueprint.route('/cart/remove_book/<int:book_id>', methods=['POST'])
+@query_budget(3)
 def remove_book_from_cart(book_id):
     """Remove all copies of book from cart"""
 
-    update_cart_quantity(book_id, change=-9999)
+    with session_scope() as db_session:
+        update_cart_quantity(db_session, book_id, change=-9999)
     flash("Book removed from cart", "warning")
     return redirect(url_for('order.cart'))
 
 
 @order_blueprint.route('/cart', methods=['GET', 'POST'])
+@query_budget(2)
 def cart():
     """Cart page: shows all items in cart, total price"""
 
@@ -57,6 +65,7 @@ def cart():
 
 
 @order_blueprint.route('/order', methods=['GET', 'POST'])
+@query_budget(2)
 @login_required
 def order():
     """
@@ -90,18 +99,14 @@ def order():
             step = 'summary'
 
         elif step == 'summary':
-            flask_session['cart_items'] = cart_items
-            flask_session['total_price'] = total_price
+            # only ids and quantities, order_success loads titles and prices again
+            flask_session['checkout'] = {str(item['id']): item['quantity'] for item in cart_items}
 
             if flask_session.get('payment_method') == 'card':
                 return redirect(url_for('order.payment_redirect'))
 
             return redirect(url_for('order.order_success'))
 
-    flask_session['cart_items'] = cart_items
-    flask_session['total_price'] = total_price
-
-
     return render_template(
             'order/order.html',
             step=step,
@@ -128,6 +133,7 @@ def payment_redirect():
 
 
 @order_blueprint.route('/order/success')
+@query_budget(7)
 @login_required
 def order_success():
     """
@@ -135,21 +141,22 @@ def order_success():
     Function finalizes order: creates new order, decreases  stock, and cleans up cart session and table
     """
 
-    cart_items = flask_session.get('cart_items', [])
-    total_price = flask_session.get('total_price', 0)
+    with session_scope() as db_session:
+        cart_items = get_items_for_quantities(db_session, flask_session.get('checkout', {}))
+    total_price = calculate_total_price(cart_items)
 
     if not cart_items:
         flash('No order found', 'warning')
         return redirect(url_for('order.cart'))
 
-    order = finalize_order(cart_items)
+    with session_scope() as db_session:
+        order = finalize_order(db_session, cart_items)
 
     if not order:
         flash('Order could not be created', 'danger')
         return redirect(url_for('order.cart'))
 
-    flask_session.pop('cart_items', None)
-    flask_session.pop('total_price', None)
+    flask_session.pop('checkout', None)
     flask_session.pop('address', None)
     flask_session.pop('payment_method', None)
     flask_session.pop('delivery_method', None)
@@ -163,6 +170,7 @@ def order_success():
 
 
 @order_blueprint.route('/order_history', methods=['GET', 'POST'])
+@query_budget(7)
 @login_required
 def order_history():
     """Order history page: shows all past orders, sorts them by active and complete"""
@@ -1,15 +1,20 @@
+from collections import namedtuple
+
 from flask import flash
 from flask_login import current_user
 from flask import session as flask_session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case, delete, literal, select, update, insert
 
 from sqlalchemy.orm import joinedload
 
-from app.database import session_scope
+from app.database import session_scope, dialect_insert, on_commit
+from app.async_database import run_read
 
-from app.order.models import Order, OrderItem, CartItem
+from app.order.models import Order, OrderItem, CartItem, BookSales
 from app.products.models import Book, Stock
-from app.common.services import book_to_dict, cart_item_to_dict, order_to_dict
+from app.common.cache import TTLCache
+from app.common.services import cart_item_to_dict, order_to_dict, book_card_columns, to_book_cards, BookCard
+from config import TOP_BOOKS_LIMIT, TOP_BOOKS_TTL
 
 from datetime import datetime
 
@@ -17,84 +22,157 @@ from datetime import datetime
 Python file for order and cart supporting functions
 """
 
-def update_cart_guest(book_id: int, stock: int, change: int) -> bool:
-    """Update cart for unathorized users"""
+_top_books_cache = TTLCache(ttl=TOP_BOOKS_TTL, maxsize=1)
 
-    cart = flask_session.get('cart', {})
-    book_id_str = str(book_id)
-    current_qty = cart.get(book_id_str, 0)
+CART_ADD = 'add'
+CART_SET = 'set'
 
-    new_qty, success = increase_or_decrease_quantity(current_qty, change, stock)
-    if not success:
-        flash("Out of stock", "warning")
-        return False
-    elif new_qty == 0:
-        cart.pop(book_id_str, None)
-    else:
-        cart[book_id_str] = new_qty
+CartUpdate = namedtuple('CartUpdate', ['quantities', 'not_found', 'out_of_stock'])
 
-    flask_session['cart'] = cart
-    return True
 
-def update_cart_quantity(book_id: int, change: int) -> bool:
+def update_cart_quantity(db_session, book_id: int, change: int) -> bool:
     """Update quantity of products in cart by {change} number"""
 
-    with session_scope() as session:
-        book = session.query(Book).get(book_id)
-        if not book:
-            flash("Книга не найдена", "error")
-            return False
+    result = update_cart_batch(db_session, {book_id: change})
+    if result.not_found:
+        flash("Книга не найдена", "error")
+    elif result.out_of_stock:
+        flash("Out of stock", "warning")
 
-        stock = check_stock(session, book_id)
+    return book_id in result.quantities
 
-        if current_user.is_authenticated:
-            return update_cart_auth(session, book_id, stock, change)
-        else:
-            return update_cart_guest(book_id, stock, change)
 
+def get_cart_state(db_session, book_ids) -> dict[int, tuple[int, int]]:
+    """
+    Stock and current cart quantity of several products, one query
+    :returns {book_id: (stock, quantity in cart)}, unknown book ids are missing
+    """
+    if current_user.is_authenticated:
+        rows = (
+            db_session.query(Book.id, Stock.quantity, CartItem.quantity)
+            .outerjoin(Stock, Stock.book_id == Book.id)
+            .outerjoin(CartItem, (CartItem.book_id == Book.id) & (CartItem.user_id == current_user.id))
+            .filter(Book.id.in_(book_ids))
+            .all()
+        )
+        return {book_id: (stock or 0, qty or 0) for book_id, stock, qty in rows}
+
+    cart = flask_session.get('cart', {})
+    rows = (
+        db_session.query(Book.id, Stock.quantity)
+        .outerjoin(Stock, Stock.book_id == Book.id)
+        .filter(Book.id.in_(book_ids))
+        .all()
+    )
+    return {book_id: (stock or 0, cart.get(str(book_id), 0)) for book_id, stock in rows}
 
-def update_cart_auth(session, book_id: int, stock: int, change: int) -> bool:
-    """Update quantity of products in cart by {change} number for authorized users"""
 
-    user_id = current_user.id
-    cart_item = session.query(CartItem).filter_by(user_id=user_id, book_id=book_id).first()
-
-    if cart_item:
-        new_qty, success = increase_or_decrease_quantity(cart_item.quantity, change, stock)
-        if not success:
-            flash("Out of stock", "warning")
-            return False
-        elif new_qty == 0:
-            session.delete(cart_item)
-            return True
-        else:
-            cart_item.quantity = new_qty
-            return True
+def update_cart_batch(db_session, changes: dict[int, int], mode: str = CART_ADD) -> CartUpdate:
+    """
+    Apply several cart changes at once: one query validates all of them against stock,
+    cart_items are changed with one upsert on (user_id, book_id) (+ one DELETE for removed books).
+    Changes above stock are rejected, decreasing quantity is always allowed
+    :param db_session: database session
+    :param changes: {book_id: quantity change} for CART_ADD or {book_id: new quantity} for CART_SET
+    :param mode: CART_ADD or CART_SET
+    :returns CartUpdate(quantities={book_id: new quantity} of changed books, not_found, out_of_stock)
+    """
+    changes = {int(book_id): int(qty) for book_id, qty in changes.items()}
+    if not changes:
+        return CartUpdate({}, [], [])
+
+    state = get_cart_state(db_session, changes.keys())
+    not_found = sorted(book_id for book_id in changes if book_id not in state)
+    out_of_stock = []
+    quantities = {}
+
+    for book_id, (stock, current_qty) in state.items():
+        change = changes[book_id]
+        new_qty = max(0, current_qty + change if mode == CART_ADD else change)
+
+        if new_qty > stock and new_qty > current_qty:
+            out_of_stock.append(book_id)
+        elif new_qty != current_qty:
+            quantities[book_id] = new_qty
+
+    if current_user.is_authenticated:
+        save_cart_auth(db_session, quantities)
     else:
-        if change > 0:
-            session.add(CartItem(user_id=user_id, book_id=book_id, quantity=min(change, stock)))
-            return True
+        save_cart_guest(quantities)
+
+    return CartUpdate(quantities, not_found, sorted(out_of_stock))
+
+
+def save_cart_auth(db_session, quantities: dict[int, int]):
+    """Write new cart quantities of authorized user, quantity 0 removes the book"""
+
+    user_id = current_user.id
+    upserts = [{'user_id': user_id, 'book_id': book_id, 'quantity': qty}
+               for book_id, qty in quantities.items() if qty > 0]
+    removed = [book_id for book_id, qty in quantities.items() if qty == 0]
+
+    if upserts:
+        stmt = dialect_insert(db_session, CartItem).values(upserts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.user_id, CartItem.book_id],
+            set_={'quantity': stmt.excluded.quantity}
+        )
+        db_session.execute(stmt)
+
+    if removed:
+        db_session.execute(
+            delete(CartItem)
+            .where(CartItem.user_id == user_id, CartItem.book_id.in_(removed))
+        )
+
+
+def save_cart_guest(quantities: dict[int, int]):
+    """Write new cart quantities to flask session for unauthorized users"""
+    if not quantities:
+        return
+
+    cart = flask_session.get('cart', {})
+    for book_id, qty in quantities.items():
+        if qty > 0:
+            cart[str(book_id)] = qty
         else:
-            return False
+            cart.pop(str(book_id), None)
+
+    flask_session['cart'] = cart
 
 
-def increase_or_decrease_quantity(current_qty: int, change: int, stock: int) -> tuple[int, bool]:
+def merge_guest_cart(db_session, user_id: int) -> int:
     """
-    Increase/descrease quantity of an item
-    :param current_qty: current quantity of products
-    :param change: number we increase/decrease with
-    :param stock: current number of items in stock
-
-    :returns tuple(new_qty, success)
-    success=False is stock is exceeded
+    Move guest cart from flask session into user's cart_items on login, one INSERT .. SELECT upsert.
+    Quantities of books already in the cart are added up, every line is clamped to stock
+    :param db_session: database session
+    :param user_id: id of the user who just logged in
+    :returns number of merged cart lines
     """
-    new_qty = current_qty + change
-    if new_qty > stock:
-        return current_qty, False
-    elif new_qty <= 0:
-        return 0, True
-    else:
-        return new_qty, True
+    cart = {int(book_id): qty for book_id, qty in flask_session.pop('cart', {}).items() if qty > 0}
+    if not cart:
+        return 0
+
+    requested = case(cart, value=Stock.book_id)
+    merged = func.coalesce(CartItem.quantity, 0) + requested
+    guest_lines = (
+        select(literal(user_id), Stock.book_id, least(merged, Stock.quantity))
+        .outerjoin(CartItem, (CartItem.book_id == Stock.book_id) & (CartItem.user_id == user_id))
+        .where(Stock.book_id.in_(cart.keys()), Stock.quantity > 0)
+    )
+
+    stmt = dialect_insert(db_session, CartItem).from_select(['user_id', 'book_id', 'quantity'], guest_lines)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItem.user_id, CartItem.book_id],
+        set_={'quantity': stmt.excluded.quantity}
+    )
+
+    return db_session.execute(stmt).rowcount
+
+
+def least(a, b):
+    """Portable LEAST(a, b), SQLite has no LEAST()"""
+    return case((a < b, a), else_=b)
 
 
 def get_cart_items(db_session):
@@ -144,12 +222,13 @@ def get_cart_items_auth(db_session) -> list[dict]:
     """
 
     items = (
-        db_session.query(CartItem)
-        .options(joinedload(CartItem.book))
+        db_session.query(Book.id, Book.title, Book.author, Book.price, Book.cover, CartItem.quantity)
+        .join(CartItem, CartItem.book_id == Book.id)
         .filter(CartItem.user_id == current_user.id)
+        .order_by(CartItem.id)
         .all()
     )
-    return [cart_item_to_dict(item, db_session) for item in items]
+    return [cart_item_to_dict(item) for item in items]
 
 
 def get_cart_items_session(db_session) -> list[dict]:
@@ -158,63 +237,128 @@ def get_cart_items_session(db_session) -> list[dict]:
     :param db_session: db session
     :return: list of item dictionary
     """
-    cart = flask_session.get('cart', {})
-    if not cart:
+    return get_items_for_quantities(db_session, flask_session.get('cart', {}))
+
+
+def get_items_for_quantities(db_session, quantities: dict) -> list[dict]:
+    """
+    Load cart item dicts for {book_id: quantity} stored in session (guest cart, checkout)
+    :param db_session: db session
+    :param quantities: {book_id (str or int): quantity}
+    :return: list of item dictionary, in the order of quantities
+    """
+    if not quantities:
         return []
 
-    books = db_session.query(Book).filter(Book.id.in_(cart.keys())).all()
+    books = (
+        db_session.query(Book.id, Book.title, Book.author, Book.price, Book.cover)
+        .filter(Book.id.in_([int(book_id) for book_id in quantities.keys()]))
+        .all()
+    )
     book_map = {b.id: b for b in books}
 
     items = []
-    for book_id_str, quantity in cart.items():
-        book = book_map.get(int(book_id_str))
+    for book_id, quantity in quantities.items():
+        book = book_map.get(int(book_id))
         if book:
             items.append(cart_item_to_dict(book, quantity=quantity))
     return items
 
-def clear_cart():
+def clear_cart(db_session):
     """Remove all the ordered items from cart table in db and flask session"""
     if current_user.is_authenticated:
-        with session_scope() as db_session:
-            db_session.query(CartItem).filter(
-                CartItem.user_id == current_user.id
-            ).delete()
+        db_session.query(CartItem).filter(
+            CartItem.user_id == current_user.id
+        ).delete()
     else:
         flask_session.pop('cart', None)
 
 
-def create_new_order(cart_items):
+class OutOfStockError(Exception):
+    """Raised when some of the ordered books don't have enough copies in stock"""
+
+    def __init__(self, book_ids: list[int]):
+        self.book_ids = book_ids
+        super().__init__(f'Not enough stock for books: {book_ids}')
+
+
+def reserve_stock(db_session, quantities: dict[int, int]) -> list[int]:
+    """
+    Decrease stock of all the ordered books with one conditional UPDATE.
+    A book is decreased only if it has enough copies, so concurrent checkouts can't oversell.
+    Stock rows are locked in book_id order (FOR UPDATE on PostgreSQL) to avoid deadlocks
+    :param quantities: {book_id: quantity}
+    :returns ids of books without enough stock, sorted
+    """
+    if not quantities:
+        return []
+
+    requested = case(quantities, value=Stock.book_id)
+    locked = (
+        select(Stock.id)
+        .where(Stock.book_id.in_(quantities.keys()))
+        .order_by(Stock.book_id)
+        .with_for_update()
+        .subquery()
+    )
+    stmt = (
+        update(Stock)
+        .where(Stock.id == locked.c.id)
+        .where(Stock.quantity >= requested)
+        .values(quantity=Stock.quantity - requested)
+        .returning(Stock.book_id)
+        .execution_options(synchronize_session=False)
+    )
+    reserved = set(db_session.execute(stmt).scalars())
+
+    return sorted(set(quantities) - reserved)
+
+
+def create_new_order(db_session, cart_items):
     """
-    Create new order from cart items
+    Create new order from cart items, stock is reserved for all items or none of them.
+    Constant number of statements regardless of cart size:
+    stock UPDATE, order INSERT ... RETURNING, one batched INSERT of items, sales upsert
+    :param db_session: database session, rolled back by caller on OutOfStockError
     :param cart_items: products from cart
     :return: order added to database
+    :raises OutOfStockError: if some books don't have enough copies
     """
-    order = Order(
-        user_id=current_user.id,
-        date=datetime.now(),
-        status='active',
-        address=flask_session.get('address', '')
+    quantities = {}
+    for item in cart_items:
+        quantities[item['id']] = quantities.get(item['id'], 0) + item['quantity']
+
+    failed_ids = reserve_stock(db_session, quantities)
+    if failed_ids:
+        raise OutOfStockError(failed_ids)
+
+    order = db_session.scalars(
+        insert(Order).returning(Order),
+        [{
+            'user_id': current_user.id,
+            'date': datetime.now(),
+            'status': 'active',
+            'address': flask_session.get('address', '')
+        }]
+    ).one()
+
+    db_session.execute(
+        insert(OrderItem),
+        [{
+            'order_id': order.id,
+            'book_id': item['id'],
+            'quantity': item['quantity'],
+            'price': item['price'] * item['quantity']
+        } for item in cart_items]
     )
-    with session_scope() as db_session:
-        db_session.add(order)
-        db_session.flush()
-
-        for item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                book_id=item['id'],
-                quantity=item['quantity'],
-                price=item['price'] * item['quantity']
-            )
-            db_session.add(order_item)
-
-            stock = db_session.query(Stock).filter_by(book_id=item['id']).first()
-            if stock:
-                stock.quantity = max(0, stock.quantity - item['quantity'])
 
+    add_book_sales(db_session, cart_items)
+    db_session.expunge(order)
+
+    on_commit(db_session, invalidate_top_books)
     return order
 
-def finalize_order(cart_items):
+def finalize_order(db_session, cart_items):
     """
     Creates order, decreases stock, clears cart table.
     Returns created order or None.
@@ -222,8 +366,15 @@ def finalize_order(cart_items):
     if not cart_items:
         return None
 
-    order = create_new_order(cart_items)
-    clear_cart()
+    try:
+        order = create_new_order(db_session, cart_items)
+    except OutOfStockError as e:
+        db_session.rollback()
+        titles = [item['title'] for item in cart_items if item['id'] in e.book_ids]
+        flash(f"Not enough copies in stock: {', '.join(titles)}", 'danger')
+        return None
+
+    clear_cart(db_session)
 
     return order
 
@@ -256,58 +407,103 @@ def update_order_status(db_session, order_id: int|str, new_status: str):
 
     order = db_session.query(Order).filter_by(id=order_id, user_id=current_user.id).first()
     order.status = new_status
-    db_session.commit()
 
 
 def delete_order(db_session, order_id):
     """Delete pending order - not used atm"""
     order = db_session.query(Order).filter_by(id=order_id, user_id=current_user.id).first()
     db_session.delete(order)
-    db_session.commit()
 
 
 
-def get_top_books() -> list[dict]:
+def add_book_sales(db_session, cart_items):
     """
-    Get top 3 products for home page. Ranks products by sales -> by rating
+    Increment sales leaderboard for ordered books with one upsert statement
+    :param cart_items: ordered items, dicts with id and quantity
     """
+    sold = {}
+    for item in cart_items:
+        sold[item['id']] = sold.get(item['id'], 0) + item['quantity']
+    if not sold:
+        return
 
-    with session_scope() as db_session:
-        sales_subquery = (
-            db_session.query(
-                OrderItem.book_id,
-                func.sum(OrderItem.quantity).label('sales_count')
-            )
-            .group_by(OrderItem.book_id)
-            .subquery()
-        )
+    stmt = dialect_insert(db_session, BookSales).values(
+        [{'book_id': book_id, 'sales_count': qty} for book_id, qty in sold.items()]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[BookSales.book_id],
+        set_={'sales_count': BookSales.sales_count + stmt.excluded.sales_count}
+    )
+    db_session.execute(stmt)
 
-        top_books_raw = (
-            db_session.query(Book)
-            .options(
-                joinedload(Book.genres),
-                joinedload(Book.stock)
-            )
-            .join(Stock, Stock.book_id == Book.id)
-            .outerjoin(sales_subquery, Book.id == sales_subquery.c.book_id)
-            .filter(Stock.quantity > 0)
-            .order_by(
-                desc(sales_subquery.c.sales_count),
-                desc(Book.rating)
-            )
-            .limit(3)
-            .all()
+
+def rebuild_book_sales(db_session) -> int:
+    """
+    Recalculate sales leaderboard from order history in one GROUP BY pass.
+    Used to fill the table for existing orders
+    :returns number of books in leaderboard
+    """
+    db_session.query(BookSales).delete()
+
+    sales = (
+        db_session.query(
+            OrderItem.book_id,
+            func.sum(OrderItem.quantity)
+        )
+        .filter(OrderItem.book_id.isnot(None))
+        .group_by(OrderItem.book_id)
+        .all()
+    )
+    if sales:
+        db_session.execute(
+            BookSales.__table__.insert(),
+            [{'book_id': book_id, 'sales_count': qty} for book_id, qty in sales]
         )
 
-        return [book_to_dict(b) for b in top_books_raw]
+    invalidate_top_books()
+    return len(sales)
+
+
+def invalidate_top_books():
+    """Drop cached top books, next home page view reloads them"""
+    _top_books_cache.invalidate()
 
 
-def check_stock(db_session, book_id:int) -> int:
+def get_top_books() -> list[BookCard]:
     """
-    Function to check how many products are in stock for order
-    :returns quantity of products in stock
+    Get top products for home page. Ranks products by sales -> by rating
+    Reads precomputed book_sales leaderboard, result is cached for TOP_BOOKS_TTL seconds
     """
-    stock = (db_session.query(Stock)
-            .filter_by(book_id=book_id).first())
+    return _top_books_cache.get_or_set('top_books', load_top_books)
+
+
+async def get_top_books_async() -> list[BookCard]:
+    """get_top_books for async views, cache miss is loaded through AsyncSession"""
+    return await _top_books_cache.get_or_set_async('top_books', lambda: run_read(query_top_books))
+
+
+def load_top_books() -> list[BookCard]:
+    """Load top products from book_sales leaderboard"""
+
+    with session_scope() as db_session:
+        return query_top_books(db_session)
+
+
+def query_top_books(db_session) -> list[BookCard]:
+    """Top products query: in stock, by sales -> by rating"""
+    sales_count = func.coalesce(BookSales.sales_count, 0)
+
+    top_books_raw = (
+        db_session.query(*book_card_columns())
+        .join(Stock, Stock.book_id == Book.id)
+        .outerjoin(BookSales, BookSales.book_id == Book.id)
+        .filter(Stock.quantity > 0)
+        .order_by(
+            desc(sales_count),
+            desc(Book.rating)
+        )
+        .limit(TOP_BOOKS_LIMIT)
+        .all()
+    )
 
-    return stock.quantity if stock else 0
+    return to_book_cards(top_books_raw)
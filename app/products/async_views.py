@@ -0,0 +1,133 @@
+import asyncio
+
+from flask import abort, flash, render_template, request
+
+from config import settings, BOOK_CATEGORIES, SEARCH_PAGE_SIZE, HOME_MAX_AGE, CATALOG_MAX_AGE
+
+from app.async_database import run_read
+from app.common.query_counter import query_budget
+from app.common.http_cache import conditional_response_async
+
+from app.products.services import search_books, get_book_availability, get_catalog_version, get_catalog_page
+from app.products.fragments import get_book_fragments_async
+from app.products.catalog_snapshot import get_catalog_snapshot
+from app.products.facets import parse_facet_filters, get_facet_counts, facet_options, category_genres
+from app.order.services import get_top_books_async
+
+"""
+Async versions of the read-only product pages, installed instead of the sync views
+of products_routes when ASYNC_READS_ENABLED is set (see init_async_reads).
+Same templates, caching and query budgets, independent queries are awaited concurrently
+"""
+
+
+@query_budget(3)
+async def home():
+    """Home page: top 3 products of the week, categories"""
+
+    categories = list(BOOK_CATEGORIES.keys())
+    top_books = await get_top_books_async()
+
+    async def render():
+        return render_template('products/home.html', top_books=top_books, categories=categories)
+
+    return await conditional_response_async(render, (top_books,), max_age=HOME_MAX_AGE)
+
+
+@query_budget(6)
+async def search():
+    """Search page: filters catalog by requested author/title, ranked and paginated"""
+
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+
+    catalog_version = await run_read(get_catalog_version)
+
+    async def render():
+        books = []
+        if query:
+            books = await run_read(search_books, query, SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE)
+
+        return render_template('products/catalog.html',
+                               books=books[:SEARCH_PAGE_SIZE],
+                               query=query,
+                               page=page,
+                               has_next=len(books) > SEARCH_PAGE_SIZE)
+
+    return await conditional_response_async(render, (catalog_version,), catalog_version, CATALOG_MAX_AGE)
+
+
+@query_budget(5)
+async def catalog(category):
+    """Catalog page with facets: page and facet counts (with the total) are queried concurrently"""
+
+    selected_genre = request.args.get('genre')
+    facet_filters = parse_facet_filters(request.args)
+
+    catalog_version = await run_read(get_catalog_version)
+
+    async def render():
+        if settings.CATALOG_SNAPSHOT_ENABLED:
+            await run_read(get_catalog_snapshot)  # (re)built once, before the concurrent tasks read it
+
+        page, facet_counts = await asyncio.gather(
+            run_read(get_catalog_page, category, selected_genre,
+                     request.args.get('after', type=int),
+                     request.args.get('before', type=int),
+                     request.args.get('per_page', type=int),
+                     facet_filters),
+            run_read(get_facet_counts, category, selected_genre, facet_filters),
+        )
+
+        return render_template(
+            'products/catalog.html',
+            categories=list(BOOK_CATEGORIES.keys()),
+            current_category=category or 'All',
+            genres=category_genres(category),
+            genre_counts=facet_counts['genre'],
+            facets=facet_options(facet_counts, facet_filters),
+            facet_filters=facet_filters,
+            current_genre=selected_genre,
+            books=page['books'],
+            next_cursor=page['next_cursor'],
+            prev_cursor=page['prev_cursor'],
+            per_page=page['per_page'],
+            total_count=facet_counts['total']
+        )
+
+    return await conditional_response_async(render, (catalog_version,), catalog_version, CATALOG_MAX_AGE)
+
+
+@query_budget(4)
+async def book_info(book_id: int):
+    """
+    Book info page: cached book body and reviews (book and reviews queried concurrently on a miss),
+    stock and cart badges are queried alongside
+    """
+
+    fragments, (stock, qty_in_cart, last_modified) = await asyncio.gather(
+        get_book_fragments_async(book_id),
+        run_read(get_book_availability, book_id),
+    )
+    if fragments is None:
+        abort(404)
+
+    async def render():
+        if stock == 0:
+            flash('No copies available now. Please, try later', 'danger')
+
+        return render_template('products/book_info.html',
+                               book=fragments['book'],
+                               fragments=fragments,
+                               qty_in_cart=qty_in_cart,
+                               available=stock != 0)
+
+    return await conditional_response_async(render, (last_modified, stock, qty_in_cart), last_modified)
+
+
+async_views = {
+    'products.home': home,
+    'products.search': search,
+    'products.catalog': catalog,
+    'products.book_info': book_info,
+}
@@ -0,0 +1,208 @@
+import csv
+import io
+import random
+import time
+from itertools import islice
+
+from sqlalchemy import func, select, update, text
+
+from app.products.models import Book, Genre, Stock, CatalogImport, book_genre
+
+"""
+Python file for streaming catalogue import from CSV (title,author,price,genre,cover_url,description,rating,year).
+Rows are processed in chunks: PostgreSQL COPY for products, stock and book_genre, executemany elsewhere.
+Every chunk is committed together with its checkpoint, so an interrupted import resumes after the last chunk
+"""
+
+DEFAULT_QTY = 3
+DEFAULT_COVERS = [
+    'img/book_cover1.jpg',
+    'img/book_cover2.jpg',
+    'img/book_cover3.jpg',
+]
+PRODUCT_COLUMNS = ['id', 'title', 'author', 'year', 'price', 'rating', 'catalog_rating', 'cover', 'description']
+PARAMS_BATCH = 1000
+
+
+def open_csv(path: str):
+    return open(path, newline='', encoding='utf-8')
+
+
+def split_genres(value: str | None) -> list[str]:
+    """'Novel, Fantasy' -> ['Novel', 'Fantasy']"""
+    return [g.strip() for g in (value or '').split(',') if g.strip()]
+
+
+def read_chunks(path: str, chunk_size: int, skip_rows: int = 0):
+    """Stream CSV rows as lists of dicts, {chunk_size} rows each, skipping the first {skip_rows}"""
+    with open_csv(path) as f:
+        reader = csv.DictReader(f, quotechar='"')
+        for _ in islice(reader, skip_rows):
+            pass
+        while chunk := list(islice(reader, chunk_size)):
+            yield chunk
+
+
+def collect_genre_names(path: str) -> set[str]:
+    """Pre-pass over the file: distinct genre names, memory is bounded by the number of genres"""
+    names = set()
+    with open_csv(path) as f:
+        for row in csv.DictReader(f, quotechar='"'):
+            names.update(split_genres(row['genre']))
+    return names
+
+
+def resolve_genres(connection, names: set[str]) -> dict[str, int]:
+    """
+    Get ids for all the genre names, creating missing genres
+    :returns {genre name: genre id}
+    """
+    names = sorted(names)
+    genre_ids = {}
+
+    def load_existing():
+        for start in range(0, len(names), PARAMS_BATCH):
+            batch = names[start:start + PARAMS_BATCH]
+            genre_ids.update(connection.execute(
+                select(Genre.name, Genre.id).where(Genre.name.in_(batch))
+            ).all())
+
+    load_existing()
+    missing = [name for name in names if name not in genre_ids]
+    if missing:
+        connection.execute(Genre.__table__.insert(), [{'name': name} for name in missing])
+        load_existing()
+
+    return genre_ids
+
+
+def reserve_product_ids(connection, count: int) -> list[int]:
+    """
+    Reserve ids for {count} new products.
+    PostgreSQL: taken from products id sequence (safe with concurrent inserts),
+    other databases: continue after max(id), import must be the only writer
+    """
+    if connection.dialect.name == 'postgresql':
+        return list(connection.execute(
+            text("SELECT nextval(pg_get_serial_sequence('products', 'id')) FROM generate_series(1, :count)"),
+            {'count': count}
+        ).scalars())
+
+    max_id = connection.execute(select(func.max(Book.id))).scalar() or 0
+    return list(range(max_id + 1, max_id + 1 + count))
+
+
+def copy_rows(connection, table, columns: list[str], rows: list[tuple]):
+    """
+    Bulk insert rows: PostgreSQL COPY FROM STDIN (psycopg2 / psycopg), executemany fallback
+    :param table: sqlalchemy Table
+    :param columns: column names, in rows order
+    :param rows: list of tuples
+    """
+    if not rows:
+        return
+
+    if connection.dialect.name != 'postgresql':
+        connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+        return
+
+    copy_sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+    cursor = connection.connection.cursor()
+
+    if hasattr(cursor, 'copy_expert'):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(f'{copy_sql} WITH (FORMAT csv)', buffer)
+    else:
+        with cursor.copy(copy_sql) as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def get_checkpoint(connection, source: str, restart: bool = False) -> int:
+    """Rows already imported from source, creates checkpoint row for a new import"""
+    rows_done = connection.execute(
+        select(CatalogImport.rows_done).where(CatalogImport.source == source)
+    ).scalar()
+
+    if rows_done is None:
+        connection.execute(CatalogImport.__table__.insert(), [{'source': source, 'rows_done': 0}])
+        return 0
+
+    if restart:
+        save_checkpoint(connection, source, 0)
+        return 0
+
+    return rows_done
+
+
+def save_checkpoint(connection, source: str, rows_done: int):
+    connection.execute(
+        update(CatalogImport)
+        .where(CatalogImport.source == source)
+        .values(rows_done=rows_done)
+    )
+
+
+def import_chunk(connection, rows: list[dict], genre_ids: dict[str, int], quantity: int) -> int:
+    """Insert one chunk of CSV rows into products, stock and book_genre"""
+    product_ids = reserve_product_ids(connection, len(rows))
+
+    products, stock, genres = [], [], []
+    for book_id, row in zip(product_ids, rows):
+        rating = float(row['rating']) if row.get('rating') else None
+        products.append((
+            book_id,
+            row['title'],
+            row['author'],
+            int(row['year']) if row.get('year') else None,
+            float(row['price']),
+            rating,
+            rating,
+            random.choice(DEFAULT_COVERS),
+            row.get('description') or None,
+        ))
+        stock.append((book_id, quantity))
+        genres.extend((book_id, genre_ids[name]) for name in dict.fromkeys(split_genres(row['genre'])))
+
+    copy_rows(connection, Book.__table__, PRODUCT_COLUMNS, products)
+    copy_rows(connection, Stock.__table__, ['book_id', 'quantity'], stock)
+    copy_rows(connection, book_genre, ['book_id', 'genre_id'], genres)
+
+    return len(rows)
+
+
+def import_catalog(engine, path: str, chunk_size: int = 5000, quantity: int = DEFAULT_QTY,
+                   source: str | None = None, restart: bool = False, progress=print) -> int:
+    """
+    Stream catalogue CSV into database
+    :param engine: sqlalchemy engine
+    :param path: csv file path
+    :param chunk_size: rows per transaction
+    :param quantity: stock quantity for every imported book
+    :param source: checkpoint key, file path by default
+    :param restart: ignore checkpoint and import the whole file again
+    :param progress: callable receiving progress messages
+    :returns number of rows imported in this run
+    """
+    source = source or path
+
+    with engine.begin() as connection:
+        rows_done = get_checkpoint(connection, source, restart)
+        genre_ids = resolve_genres(connection, collect_genre_names(path))
+
+    if rows_done:
+        progress(f'resuming after {rows_done} rows')
+
+    started = time.perf_counter()
+    imported = 0
+    for chunk in read_chunks(path, chunk_size, skip_rows=rows_done):
+        with engine.begin() as connection:
+            imported += import_chunk(connection, chunk, genre_ids, quantity)
+            save_checkpoint(connection, source, rows_done + imported)
+
+        elapsed = time.perf_counter() - started
+        progress(f'{rows_done + imported} rows imported ({imported / elapsed:.0f} rows/s)')
+
+    return imported
@@ -0,0 +1,179 @@
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from threading import Lock, RLock
+
+from sqlalchemy import BigInteger, cast, func, select
+
+from app.products.models import Book, Genre, book_genre
+from config import BOOK_CATEGORIES, CATALOG_SNAPSHOT_TTL, CATALOG_SNAPSHOT_CHECK_INTERVAL
+
+"""
+Python file for the in-process catalogue snapshot: sorted arrays of book ids per genre and per category,
+so catalogue pages resolve category / genre filters and counts without joining book_genre.
+The snapshot is rebuilt when the version of products and their genres in the database changes
+(checked every CATALOG_SNAPSHOT_CHECK_INTERVAL seconds), or after CATALOG_SNAPSHOT_TTL seconds
+"""
+
+
+def intersect_sorted(a: array, b: array) -> array:
+    """Intersection of two sorted id arrays, binary search of the smaller one in the larger one"""
+    if len(a) > len(b):
+        a, b = b, a
+
+    result = array('i')
+    position = 0
+    for book_id in a:
+        position = bisect_left(b, book_id, position)
+        if position == len(b):
+            break
+        if b[position] == book_id:
+            result.append(book_id)
+    return result
+
+
+def union_sorted(arrays: list[array]) -> array:
+    """Union of sorted id arrays"""
+    return array('i', sorted(set().union(*arrays)))
+
+
+class CatalogSnapshot:
+    """
+    Book ids of the whole catalogue, of every genre and of every category (union of its genres),
+    each a sorted array('i'). Filters follow filter_books_by_category / filter_books_by_genre
+    """
+
+    def __init__(self, all_ids: array, genre_ids: dict[str, array], version, built_at: float):
+        self.all_ids = all_ids
+        self.genre_ids = genre_ids
+        self.version = version
+        self.built_at = built_at
+        self.category_ids = {
+            category: union_sorted([genre_ids.get(name, array('i')) for name in genres])
+            for category, genres in BOOK_CATEGORIES.items()
+            if genres
+        }
+        self._combined = {}
+        self._combined_lock = Lock()
+
+    @classmethod
+    def build(cls, db_session, version) -> 'CatalogSnapshot':
+        """Load ids of all the products and their genres, one query ordered by id, so every array comes sorted"""
+        rows = db_session.execute(
+            select(Book.id, Genre.name)
+            .outerjoin(book_genre, book_genre.c.book_id == Book.id)
+            .outerjoin(Genre, Genre.id == book_genre.c.genre_id)
+            .order_by(Book.id)
+        )
+
+        all_ids = array('i')
+        genre_ids = {}
+        for book_id, name in rows:
+            if not all_ids or all_ids[-1] != book_id:
+                all_ids.append(book_id)
+            if name is not None:
+                genre_ids.setdefault(name, array('i')).append(book_id)
+
+        return cls(all_ids, genre_ids, version, time.monotonic())
+
+    def resolve(self, category: str | None, genre_name: str | None) -> array:
+        """
+        Sorted ids of products in category and genre.
+        'All', empty or unknown category means the whole catalogue
+        """
+        ids = self.category_ids.get(category, self.all_ids)
+        if not genre_name:
+            return ids
+
+        genre_ids = self.genre_ids.get(genre_name)
+        if genre_ids is None:
+            return array('i')
+        if ids is self.all_ids:
+            return genre_ids
+
+        # keys are known categories x known genres only, so request arguments can't grow the memo
+        key = (category, genre_name)
+        combined = self._combined.get(key)
+        if combined is None:
+            combined = intersect_sorted(ids, genre_ids)
+            with self._combined_lock:
+                combined = self._combined.setdefault(key, combined)
+        return combined
+
+
+def page_of_ids(ids: array, after: int | None, before: int | None, per_page: int) -> tuple[array, bool, bool]:
+    """
+    Keyset page of sorted ids, same cursors as paginate_books
+    :returns (page ids, has previous page, has next page)
+    """
+    if before is not None:
+        end = bisect_left(ids, before)
+        start = max(0, end - per_page)
+        return ids[start:end], start > 0, True
+
+    start = bisect_right(ids, after) if after is not None else 0
+    return ids[start:start + per_page], after is not None, start + per_page < len(ids)
+
+
+_snapshot = None
+# reentrant: async views run as tasks of one event loop thread, and a plain lock held
+# across the rebuild's awaited queries would block that thread's event loop for good
+_snapshot_lock = RLock()
+
+
+# (last version read from the database, monotonic time of the read)
+_checked_version = (None, float('-inf'))
+
+
+def snapshot_version_columns() -> list:
+    """
+    Version of products and their genres as scalar subqueries: count and max id of products,
+    count and checksum of book_genre rows. Changes when products are added or deleted or their genres change,
+    not on price or rating updates
+    """
+    return [
+        select(func.count()).select_from(Book).scalar_subquery(),
+        select(func.max(Book.id)).scalar_subquery(),
+        select(func.count()).select_from(book_genre).scalar_subquery(),
+        select(func.sum(cast(book_genre.c.book_id, BigInteger) * book_genre.c.genre_id)).scalar_subquery(),
+    ]
+
+
+def snapshot_version_due() -> bool:
+    """True if the version wasn't read from the database for CATALOG_SNAPSHOT_CHECK_INTERVAL seconds"""
+    return time.monotonic() - _checked_version[1] >= CATALOG_SNAPSHOT_CHECK_INTERVAL
+
+
+def remember_snapshot_version(version):
+    """Store version read from the database, e.g. along with another query (see get_catalog_version)"""
+    global _checked_version
+    _checked_version = (tuple(version), time.monotonic())
+
+
+def get_snapshot_version(db_session) -> tuple:
+    """Version of products and their genres, read from the database at most every CATALOG_SNAPSHOT_CHECK_INTERVAL"""
+    if snapshot_version_due():
+        remember_snapshot_version(db_session.execute(select(*snapshot_version_columns())).one())
+    return _checked_version[0]
+
+
+def is_current(snapshot: CatalogSnapshot | None, version: tuple) -> bool:
+    return (snapshot is not None and snapshot.version == version
+            and time.monotonic() - snapshot.built_at < CATALOG_SNAPSHOT_TTL)
+
+
+def get_catalog_snapshot(db_session) -> CatalogSnapshot:
+    """
+    Current snapshot, rebuilt if the version in the database changed or it's older than CATALOG_SNAPSHOT_TTL.
+    One thread rebuilds, the other threads wait for it instead of loading the catalogue too
+    """
+    global _snapshot
+
+    version = get_snapshot_version(db_session)
+    if is_current(_snapshot, version):
+        return _snapshot
+
+    with _snapshot_lock:
+        if not is_current(_snapshot, version):
+            _snapshot = CatalogSnapshot.build(db_session, version)
+        return _snapshot
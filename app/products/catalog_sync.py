@@ -0,0 +1,180 @@
+import hashlib
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from app.database import dialect_insert
+from app.products.fragments import bump_book_version
+from app.products.catalog_import import DEFAULT_COVERS, DEFAULT_QTY, read_chunks, split_genres, resolve_genres
+from app.products.models import Book, Stock, book_genre
+from app.products.services import average_rating
+
+"""
+Python file for incremental catalogue sync from a supplier feed.
+Feed is a CSV keyed by sku (sku,title,author,price,genre,description,rating,year[,quantity]).
+Only new or changed rows (by content hash) are upserted, stock quantities are upserted in bulk
+"""
+
+HASHED_FIELDS = ['title', 'author', 'price', 'genre', 'description', 'rating', 'year']
+
+
+def row_hash(row: dict) -> str:
+    """Content hash of feed fields, used to skip unchanged rows"""
+    content = '\x1f'.join((row.get(field) or '').strip() for field in HASHED_FIELDS)
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+def feed_row_to_values(row: dict, content_hash: str) -> dict:
+    """Convert feed row into products column values"""
+    return {
+        'sku': row['sku'],
+        'title': row['title'],
+        'author': row['author'],
+        'price': float(row['price']),
+        'year': int(row['year']) if row.get('year') else None,
+        'rating': float(row['rating']) if row.get('rating') else None,
+        'catalog_rating': float(row['rating']) if row.get('rating') else None,
+        'description': row.get('description') or None,
+        'cover': random.choice(DEFAULT_COVERS),
+        'content_hash': content_hash,
+    }
+
+
+def upsert_products(connection, values: list[dict]) -> dict[str, int]:
+    """
+    INSERT ... ON CONFLICT (sku) DO UPDATE for new/changed products.
+    Feed rating replaces the catalogue rating, the shown rating is recalculated with it (see average_rating),
+    cover is kept for existing books
+    :returns {sku: product id} of inserted or updated rows
+    """
+    stmt = dialect_insert(connection, Book).values(values)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Book.sku],
+        set_={
+            'title': excluded.title,
+            'author': excluded.author,
+            'price': excluded.price,
+            'year': excluded.year,
+            'description': excluded.description,
+            'catalog_rating': excluded.catalog_rating,
+            'rating': average_rating(Book.rating_sum, Book.rating_count, excluded.catalog_rating),
+            'content_hash': excluded.content_hash,
+            'updated_at': datetime.utcnow(),
+        },
+        where=Book.content_hash.is_distinct_from(excluded.content_hash)
+    ).returning(Book.sku, Book.id)
+
+    return dict(connection.execute(stmt).all())
+
+
+def replace_genres(connection, book_genres: dict[int, list[int]]):
+    """Replace genres of changed products: one DELETE, one executemany INSERT"""
+    if not book_genres:
+        return
+
+    connection.execute(delete(book_genre).where(book_genre.c.book_id.in_(book_genres.keys())))
+    rows = [
+        {'book_id': book_id, 'genre_id': genre_id}
+        for book_id, genre_ids in book_genres.items()
+        for genre_id in genre_ids
+    ]
+    if rows:
+        connection.execute(book_genre.insert(), rows)
+
+
+def upsert_stock(connection, quantities: dict[int, int], update_existing: bool) -> int:
+    """
+    Bulk stock upsert: one statement for the whole batch, unchanged quantities are not written
+    :param quantities: {book_id: quantity}
+    :param update_existing: False -> only create stock for new books
+    :returns number of inserted/updated stock rows
+    """
+    if not quantities:
+        return 0
+
+    stmt = dialect_insert(connection, Stock).values(
+        [{'book_id': book_id, 'quantity': qty} for book_id, qty in quantities.items()]
+    )
+    if update_existing:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Stock.book_id],
+            set_={'quantity': stmt.excluded.quantity, 'updated_at': datetime.utcnow()},
+            where=Stock.quantity != stmt.excluded.quantity
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Stock.book_id])
+
+    return connection.execute(stmt).rowcount
+
+
+def sync_batch(connection, rows: list[dict], stats: dict) -> list[int]:
+    """
+    Sync one batch of feed rows
+    :returns ids of existing products whose data was changed
+    """
+    rows = list({row['sku']: row for row in rows if row.get('sku')}.values())
+    hashes = {row['sku']: row_hash(row) for row in rows}
+
+    existing = {
+        sku: (book_id, content_hash)
+        for sku, book_id, content_hash in connection.execute(
+            select(Book.sku, Book.id, Book.content_hash).where(Book.sku.in_(hashes.keys()))
+        )
+    }
+
+    changed = [row for row in rows if existing.get(row['sku'], (None, None))[1] != hashes[row['sku']]]
+    stats['unchanged'] += len(rows) - len(changed)
+
+    book_ids = {sku: book_id for sku, (book_id, _) in existing.items()}
+    updated_ids = []
+    if changed:
+        upserted = upsert_products(connection, [feed_row_to_values(row, hashes[row['sku']]) for row in changed])
+        stats['inserted'] += sum(1 for sku in upserted if sku not in existing)
+        updated_ids = [book_id for sku, book_id in upserted.items() if sku in existing]
+        stats['updated'] += len(updated_ids)
+        book_ids.update(upserted)
+
+        genre_ids = resolve_genres(connection, {name for row in changed for name in split_genres(row['genre'])})
+        replace_genres(connection, {
+            upserted[row['sku']]: [genre_ids[name] for name in dict.fromkeys(split_genres(row['genre']))]
+            for row in changed if row['sku'] in upserted
+        })
+
+    has_quantity = 'quantity' in rows[0] if rows else False
+    quantities = {
+        book_ids[row['sku']]: int(row['quantity']) if has_quantity and row.get('quantity') else DEFAULT_QTY
+        for row in rows
+        if row['sku'] in book_ids and (has_quantity or row['sku'] not in existing)
+    }
+    stats['stock_updated'] += upsert_stock(connection, quantities, update_existing=has_quantity)
+
+    return updated_ids
+
+
+def sync_catalog(engine, path: str, batch_size: int = 1000, progress=print) -> dict:
+    """
+    Incremental catalogue sync from a supplier feed, one transaction per batch
+    :param engine: sqlalchemy engine
+    :param path: feed csv path, must contain sku column
+    :param batch_size: rows per batch
+    :param progress: callable receiving progress messages
+    :returns stats: inserted, updated, unchanged, stock_updated
+    """
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'stock_updated': 0}
+    started = time.perf_counter()
+    rows_done = 0
+
+    for batch in read_chunks(path, batch_size):
+        with engine.begin() as connection:
+            updated_ids = sync_batch(connection, batch, stats)
+        if updated_ids:
+            bump_book_version(*updated_ids)
+
+        rows_done += len(batch)
+        elapsed = time.perf_counter() - started
+        progress(f'{rows_done} rows synced ({rows_done / elapsed:.0f} rows/s): {stats}')
+
+    return stats
@@ -0,0 +1,152 @@
+from sqlalchemy import and_, case, func, select, true
+
+from app.common.cache import TTLCache
+from app.products.models import Book, Genre, book_genre
+from app.products.catalog_snapshot import get_catalog_snapshot
+from config import settings, BOOK_CATEGORIES, CATALOG_COUNT_TTL, PRICE_BANDS, YEAR_BANDS, RATING_BUCKETS
+
+"""
+Python file for faceted catalogue filtering: price, year and rating bands on top of category and genre,
+with counts per facet value.
+All the counts of a page come from at most two aggregate queries, however many values the facets have,
+and are cached for CATALOG_COUNT_TTL seconds per filter combination
+"""
+
+# facet name (query argument) -> (title, column, bands)
+FACETS = {
+    'price': ('Price', Book.price, PRICE_BANDS),
+    'year': ('Year', Book.year, YEAR_BANDS),
+    'rating': ('Rating', Book.rating, RATING_BUCKETS),
+}
+
+_facet_cache = TTLCache(ttl=CATALOG_COUNT_TTL)
+
+
+def category_genres(category: str | None) -> list[str]:
+    """Genres listed for category, all the genres for 'All' or no category"""
+    if not category or category == 'All':
+        return sorted({g for gs in BOOK_CATEGORIES.values() for g in gs})
+    return BOOK_CATEGORIES.get(category, [])
+
+
+def band_condition(column, low, high):
+    """low <= column < high, None is an open end. Books without a value are in no band"""
+    conditions = [column.is_not(None)]
+    if low is not None:
+        conditions.append(column >= low)
+    if high is not None:
+        conditions.append(column < high)
+    return and_(*conditions)
+
+
+def parse_facet_filters(args) -> dict[str, str]:
+    """Selected band of every facet from query args (?price=600-900&rating=4-plus), unknown bands are ignored"""
+    return {name: args.get(name) for name, (_, _, bands) in FACETS.items() if args.get(name) in bands}
+
+
+def facet_conditions(filters: dict[str, str]) -> dict:
+    """{facet name: condition} for selected bands"""
+    conditions = {}
+    for name, key in filters.items():
+        _, column, bands = FACETS[name]
+        _, low, high = bands[key]
+        conditions[name] = band_condition(column, low, high)
+    return conditions
+
+
+def facet_criteria(filters: dict[str, str] | None) -> list:
+    """Filter criteria of selected bands, for Query.filter(*criteria)"""
+    return list(facet_conditions(filters or {}).values())
+
+
+def get_facet_counts(db_session, category: str | None, genre_name: str | None, filters: dict[str, str]) -> dict:
+    """
+    Facet counts for category, genre and selected bands, cached for CATALOG_COUNT_TTL seconds
+    :returns see count_facets
+    """
+    key = (category or 'All', genre_name or '', tuple(sorted(filters.items())))
+    return _facet_cache.get_or_set(key, lambda: count_facets(db_session, category, genre_name, filters))
+
+
+def count_facets(db_session, category: str | None, genre_name: str | None, filters: dict[str, str]) -> dict:
+    """
+    Count products per facet value: bands by conditional aggregation over products of category (one query),
+    genres grouped by genre name (one query, or sizes of the catalogue snapshot's genre arrays).
+    Counts of a facet apply the selections of the other facets only,
+    so every value shows how many products selecting it would return
+    :returns {'total': count, 'genre': {name: count}, 'price': {band: count}, 'year': {...}, 'rating': {...}}
+    """
+    active = facet_conditions(filters)
+    if genre_name:
+        active['genre'] = Book.genres.any(Genre.name == genre_name)
+
+    counts = count_bands(db_session, category, active)
+    genres = category_genres(category)
+
+    if settings.CATALOG_SNAPSHOT_ENABLED and not filters:
+        genre_ids = get_catalog_snapshot(db_session).genre_ids
+        counts['genre'] = {name: len(genre_ids[name]) for name in genres if name in genre_ids}
+        return counts
+
+    # a book has a genre at most once, so rows of book_genre count books
+    genre_rows = db_session.execute(
+        select(Genre.name, func.count())
+        .select_from(book_genre)
+        .join(Genre, Genre.id == book_genre.c.genre_id)
+        .join(Book, Book.id == book_genre.c.book_id)
+        .where(Genre.name.in_(genres), *other_conditions(active, 'genre'))
+        .group_by(Genre.name)
+    )
+    counts['genre'] = dict(genre_rows.all())
+    return counts
+
+
+def other_conditions(active: dict, name: str) -> list:
+    """Conditions of the selected values of all the facets but {name}"""
+    return [condition for other, condition in active.items() if other != name]
+
+
+def count_bands(db_session, category: str | None, active: dict) -> dict:
+    """
+    Total and band counts of every facet in one query, sum(CASE ...) per band
+    :param active: {facet name: condition} of the selected values
+    """
+    def count_if(*conditions):
+        return func.sum(case((and_(true(), *conditions), 1), else_=0))
+
+    columns = [count_if(*active.values())]
+    for name, (_, column, bands) in FACETS.items():
+        columns += [count_if(band_condition(column, low, high), *other_conditions(active, name))
+                    for _, low, high in bands.values()]
+
+    query = select(*columns).select_from(Book)
+    genres = category_genres(category)
+    if category and category != 'All' and genres:
+        query = query.where(Book.genres.any(Genre.name.in_(genres)))
+
+    total, *band_counts = (count or 0 for count in db_session.execute(query).one())
+
+    counts = {'total': total}
+    for name, (_, _, bands) in FACETS.items():
+        counts[name] = {key: band_counts.pop(0) for key in bands}
+    return counts
+
+
+def facet_options(counts: dict, filters: dict[str, str]) -> list[dict]:
+    """
+    Facets for the catalogue sidebar
+    :returns [{name, title, values: [{key, label, count, selected, args}]}],
+        args are the band query arguments of the value's link (selecting it, or clearing it if selected)
+    """
+    options = []
+    for name, (title, _, bands) in FACETS.items():
+        values = []
+        for key, (label, _, _) in bands.items():
+            selected = filters.get(name) == key
+            args = {other: value for other, value in filters.items() if other != name}
+            if not selected:
+                args[name] = key
+            values.append({'key': key, 'label': label, 'count': counts[name][key],
+                           'selected': selected, 'args': args})
+        options.append({'name': name, 'title': title, 'values': values})
+    return options
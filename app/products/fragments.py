@@ -0,0 +1,135 @@
+import asyncio
+
+from flask import render_template
+from markupsafe import Markup
+
+from app.async_database import run_read
+from app.common.cache import TTLCache, connect_shared_store
+from config import settings, BOOK_FRAGMENT_TTL, BOOK_FRAGMENT_LOCAL_TTL, BOOK_FRAGMENT_CACHE_SIZE
+
+"""
+Python file for rendered fragments of book pages.
+Book data, rendered book body and review list are cached per book id + version,
+versions are bumped when reviews or book data change
+"""
+
+BOOK_VERSION_KEY = 'book_version:{}'
+CATALOG_VERSION_KEY = 'book_version:all'
+
+_versions = connect_shared_store(settings.FRAGMENT_CACHE_URL)
+# without a shared store version bumps reach only the process that made them
+# (not the other workers, not CLI commands), so fragments are kept only briefly
+_fragment_ttl = BOOK_FRAGMENT_TTL if settings.FRAGMENT_CACHE_URL else BOOK_FRAGMENT_LOCAL_TTL
+_fragment_cache = TTLCache(ttl=_fragment_ttl, maxsize=BOOK_FRAGMENT_CACHE_SIZE)
+_data_cache = TTLCache(ttl=_fragment_ttl, maxsize=BOOK_FRAGMENT_CACHE_SIZE)
+
+
+def get_book_version(book_id: int) -> tuple[int, int]:
+    """
+    Current version of the book's cached fragments
+    :returns (catalogue version, book version)
+    """
+    catalog_version = _versions.get(CATALOG_VERSION_KEY)
+    book_version = _versions.get(BOOK_VERSION_KEY.format(book_id))
+    return int(catalog_version or 0), int(book_version or 0)
+
+
+def bump_book_version(*book_ids: int):
+    """
+    Invalidate cached fragments of the given books,
+    without arguments invalidates fragments of all the books
+    """
+    if not book_ids:
+        _versions.incr(CATALOG_VERSION_KEY)
+        return
+
+    for book_id in book_ids:
+        _versions.incr(BOOK_VERSION_KEY.format(book_id))
+
+
+def render_book_fragments(book: dict, reviews: list[dict]) -> dict:
+    """
+    Render static parts of book page
+    :returns dict with book (id, title, price for the dynamic buy card), body and reviews html
+    """
+    return {
+        'book': {'id': book['id'], 'title': book['title'], 'price': book['price']},
+        'body': Markup(render_template('products/_book_body.html', book=book)),
+        'reviews': Markup(render_template('products/_book_reviews.html', reviews=reviews)),
+    }
+
+
+def get_book_data(db_session, book_id: int) -> tuple[dict, list[dict]] | None:
+    """
+    Get book dict and its reviews, cached until the book version changes
+    :param db_session: database session, used on cache miss only
+    :returns (book, reviews) or None if book doesn't exist
+    """
+    from app.products.services import get_book, get_reviews
+
+    key = (book_id, get_book_version(book_id))
+    data = _data_cache.get(key)
+    if data is not None:
+        return data
+
+    book = get_book(db_session, book_id)
+    if book is None:
+        return None
+
+    data = book, get_reviews(db_session, book_id)
+    _data_cache.set(key, data)
+    return data
+
+
+def get_book_fragments(db_session, book_id: int) -> dict | None:
+    """
+    Get rendered book body and review list, cached until the book version changes
+    :param db_session: database session, used on cache miss only
+    :returns dict from render_book_fragments or None if book doesn't exist
+    """
+    key = (book_id, get_book_version(book_id))
+    fragments = _fragment_cache.get(key)
+    if fragments is not None:
+        return fragments
+
+    data = get_book_data(db_session, book_id)
+    if data is None:
+        return None
+
+    fragments = render_book_fragments(*data)
+    _fragment_cache.set(key, fragments)
+    return fragments
+
+
+async def get_book_data_async(book_id: int) -> tuple[dict, list[dict]] | None:
+    """get_book_data for async views: on cache miss book and reviews are queried concurrently"""
+    from app.products.services import get_book, get_reviews
+
+    key = (book_id, get_book_version(book_id))
+    data = _data_cache.get(key)
+    if data is not None:
+        return data
+
+    book, reviews = await asyncio.gather(run_read(get_book, book_id), run_read(get_reviews, book_id))
+    if book is None:
+        return None
+
+    data = book, reviews
+    _data_cache.set(key, data)
+    return data
+
+
+async def get_book_fragments_async(book_id: int) -> dict | None:
+    """get_book_fragments for async views"""
+    key = (book_id, get_book_version(book_id))
+    fragments = _fragment_cache.get(key)
+    if fragments is not None:
+        return fragments
+
+    data = await get_book_data_async(book_id)
+    if data is None:
+        return None
+
+    fragments = render_book_fragments(*data)
+    _fragment_cache.set(key, fragments)
+    return fragments
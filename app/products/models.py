@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, Table, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, Text, Table, ForeignKey, DateTime, Float, Index, func, text
+from sqlalchemy.dialects import postgresql  # noqa: F401, registers to_tsvector() & co
 from sqlalchemy.orm import relationship
 
-from app.database import Base
+from app.database import Base, utc_now
 
 from datetime import datetime
 
@@ -11,6 +12,7 @@ book_genre = Table(
     Base.metadata,
     Column('book_id', ForeignKey('products.id'), primary_key=True),
     Column('genre_id', ForeignKey('genres.id'), primary_key=True),
+    Index('ix_book_genre_genre_id', 'genre_id'),
     )
 
 class Book(Base):
@@ -21,16 +23,50 @@ class Book(Base):
     author = Column(String(300), nullable=False)
     year = Column(Integer)
     price = Column(Float, nullable=False)
+    # rating shown in the shop: review scores and the catalogue rating (one more score), see average_rating
     rating = Column(Float)
+    # rating from the catalogue / supplier feed, defaults to rating of the new row
+    catalog_rating = Column(Float, default=lambda context: context.get_current_parameters().get('rating'))
+    rating_sum = Column(Float, nullable=False, default=0, server_default='0')
+    rating_count = Column(Integer, nullable=False, default=0, server_default='0')
 
     cover = Column(String(500))
     description = Column(Text)
 
+    # supplier feed identity and hash of feed fields, see catalog_sync
+    sku = Column(String(64), unique=True, index=True)
+    content_hash = Column(String(32))
+
+    # last change of book data, catalogue pages use max(updated_at) as ETag / Last-Modified
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=utc_now(), index=True)
+
     genres = relationship('Genre', secondary=book_genre, backref='products')
     stock = relationship('Stock', uselist=False,
                          back_populates='book', cascade='all, delete-orphan')
     reviews = relationship('Review', back_populates='book')
 
+
+def book_search_vector():
+    """
+    PostgreSQL tsvector over title (weight A), author (B) and description (C).
+    Full-text search must use this exact expression to hit the GIN index
+    """
+    config = text("'simple'::regconfig")
+
+    def weighted(column, weight):
+        return func.setweight(
+            func.to_tsvector(config, func.coalesce(column, text("''"))),
+            text(f"'{weight}'")
+        )
+
+    return (weighted(Book.title, 'A')
+            .op('||')(weighted(Book.author, 'B'))
+            .op('||')(weighted(Book.description, 'C')))
+
+
+Index('ix_products_search', book_search_vector(), postgresql_using='gin').ddl_if(dialect='postgresql')
+
 class Genre(Base):
     __tablename__ = 'genres'
 
@@ -43,20 +79,35 @@ class Stock(Base):
     id = Column(Integer, primary_key=True)
     book_id = Column(ForeignKey('products.id'), unique=True)
     quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=utc_now())
 
     book = relationship('Book', back_populates='stock')
 
 
 class Review(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        Index('ix_reviews_book_created', 'book_id', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(ForeignKey('users.id'))
     book_id = Column(ForeignKey('products.id'))
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=utc_now())
 
     score = Column(Float)
     review = Column(Text)
 
     user = relationship('User')
-    book = relationship('Book', back_populates='reviews')
\ No newline at end of file
+    book = relationship('Book', back_populates='reviews')
+
+class CatalogImport(Base):
+    """Progress of a catalogue CSV import, committed together with every imported chunk"""
+    __tablename__ = 'catalog_imports'
+
+    source = Column(String(500), primary_key=True)
+    rows_done = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
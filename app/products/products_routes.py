@@ -1,16 +1,17 @@
-from flask import flash, redirect, render_template, url_for, request
+from flask import abort, flash, redirect, render_template, url_for, request
 from flask_login import current_user, login_required
 
-from config import BOOK_CATEGORIES
+from config import BOOK_CATEGORIES, SEARCH_PAGE_SIZE, HOME_MAX_AGE, CATALOG_MAX_AGE
 
 from app.database import session_scope
 from app.products.forms import ReviewForm
+from app.common.query_counter import query_budget
+from app.common.http_cache import conditional_response
 
-from app.products.services import search_books, \
-    filter_books_by_category, filter_books_by_genre, get_book, \
-    check_stock, get_reviews, check_existing_review, add_review_score
-from app.common.services import book_to_dict, get_cart_quantity_guest, \
-    get_cart_quantity_auth
+from app.products.services import search_books, get_book_availability, \
+    check_existing_review, add_review_score, get_catalog_page, get_catalog_version
+from app.products.fragments import get_book_fragments
+from app.products.facets import parse_facet_filters, get_facet_counts, facet_options, category_genres
 
 from flask import Blueprint
 
@@ -22,6 +23,7 @@ products_blueprint = Blueprint(
 
 @products_blueprint.route('/')
 @products_blueprint.route('/home')
+@query_budget(3)
 def home():
     """Home page: top 3 products of the week, categories"""
 
@@ -30,96 +32,130 @@ def home():
     from app.order.services import get_top_books
     top_books = get_top_books()
 
-    return render_template(
-        'products/home.html',
-        top_books=top_books,
-        categories=categories
+    return conditional_response(
+        lambda: render_template(
+            'products/home.html',
+            top_books=top_books,
+            categories=categories
+        ),
+        etag_parts=(top_books,),
+        max_age=HOME_MAX_AGE
     )
 
 @products_blueprint.route('/search')
+@query_budget(6)
 def search():
-    """Search page: filters catalog by requested author/title"""
+    """Search page: filters catalog by requested author/title, ranked and paginated"""
 
     query = request.args.get('q', '').strip()
-    books = []
+    page = max(1, request.args.get('page', 1, type=int))
 
-    if query:
-        with session_scope() as db_session:
-            books = search_books(db_session, query)
+    with session_scope() as db_session:
+        catalog_version = get_catalog_version(db_session)
+
+    def render():
+        books = []
+        if query:
+            with session_scope() as db_session:
+                books = search_books(db_session, query,
+                                     limit=SEARCH_PAGE_SIZE + 1,
+                                     offset=(page - 1) * SEARCH_PAGE_SIZE)
 
-    return render_template('products/catalog.html',
-                           books=books,
-                           query=query)
+        has_next = len(books) > SEARCH_PAGE_SIZE
+
+        return render_template('products/catalog.html',
+                               books=books[:SEARCH_PAGE_SIZE],
+                               query=query,
+                               page=page,
+                               has_next=has_next)
+
+    return conditional_response(render, (catalog_version,), catalog_version, CATALOG_MAX_AGE)
 
 
 @products_blueprint.route('/catalogue', defaults={'category': None}, methods=['GET', 'POST'])
 @products_blueprint.route('/catalogue/<category>', methods=['GET', 'POST'])
+@query_budget(5)
 def catalog(category):
-    """Catalog page: filters products by category and genre"""
+    """
+    Catalog page: filters products by category, genre and price / year / rating bands, one page at a time.
+    Sidebar shows the number of products for every genre and band
+    """
 
     selected_genre = request.args.get('genre')
+    facet_filters = parse_facet_filters(request.args)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    per_page = request.args.get('per_page', type=int)
 
     with session_scope() as db_session:
-        books_query = filter_books_by_category(db_session, category)
-        books_query = filter_books_by_genre(books_query, selected_genre)
-
-        books_raw = books_query.all()
-        books = [book_to_dict(b) for b in books_raw]
+        catalog_version = get_catalog_version(db_session)
 
-    categories = list(BOOK_CATEGORIES.keys())
-    current_category = category or 'All'
-
-    if category == 'All':
-        genres_in_category = list({g for gs in BOOK_CATEGORIES.values() for g in gs})
-    else:
-        genres_in_category = BOOK_CATEGORIES.get(category, [])
-
-    return render_template(
-        'products/catalog.html',
-        categories=categories,
-        current_category=current_category,
-        genres=genres_in_category,
-        current_genre=selected_genre,
-        books=books
-    )
+    def render():
+        with session_scope() as db_session:
+            page = get_catalog_page(db_session, category, selected_genre,
+                                    after=after, before=before, per_page=per_page, filters=facet_filters)
+            facet_counts = get_facet_counts(db_session, category, selected_genre, facet_filters)
+
+        return render_template(
+            'products/catalog.html',
+            categories=list(BOOK_CATEGORIES.keys()),
+            current_category=category or 'All',
+            genres=category_genres(category),
+            genre_counts=facet_counts['genre'],
+            facets=facet_options(facet_counts, facet_filters),
+            facet_filters=facet_filters,
+            current_genre=selected_genre,
+            books=page['books'],
+            next_cursor=page['next_cursor'],
+            prev_cursor=page['prev_cursor'],
+            per_page=page['per_page'],
+            total_count=facet_counts['total']
+        )
+
+    return conditional_response(render, (catalog_version,), catalog_version, CATALOG_MAX_AGE)
 
 
 @products_blueprint.route('/book_info')
 @products_blueprint.route('/book_info/<int:book_id>')
+@query_budget(4)
 def book_info(book_id:int):
-    """Book info page: shows information about book"""
+    """
+    Book info page: cached book body and reviews, only stock and cart badges are queried on every view.
+    Private page, revalidated with ETag
+    """
 
     with session_scope() as db_session:
 
-        book = get_book(db_session, book_id)
-        stock = check_stock(db_session, book_id)
-        reviews = get_reviews(db_session, book_id)
+        fragments = get_book_fragments(db_session, book_id)
+        if fragments is None:
+            abort(404)
 
+        stock, qty_in_cart, last_modified = get_book_availability(db_session, book_id)
+
+    def render():
         if stock == 0:
             flash('No copies available now. Please, try later', 'danger')
             available = False
         else:
             available = True
 
-        if current_user.is_authenticated:
-            qty_in_cart = get_cart_quantity_auth(db_session, book_id)
-        else:
-            qty_in_cart = get_cart_quantity_guest(book_id)
+        return render_template('products/book_info.html',
+                               book=fragments['book'],
+                               fragments=fragments,
+                               qty_in_cart=qty_in_cart,
+                               available=available)
 
-    return render_template('products/book_info.html',
-                           book=book,
-                           qty_in_cart=qty_in_cart,
-                           available=available,
-                           reviews=reviews)
+    return conditional_response(render, (last_modified, stock, qty_in_cart), last_modified)
 
 @products_blueprint.route('/review/<int:book_id>', methods=['GET', 'POST'])
 @login_required
 def share_review(book_id:int):
     """Review page: share review for a book"""
-    existing_review = check_existing_review(book_id)
+    with session_scope() as db_session:
+        existing_review = check_existing_review(db_session, book_id)
     if existing_review:
         flash('You have already reviewed this book.', 'danger')
-        return redirect(url_for('books_bp.book_info', book_id=book_id))
+        return redirect(url_for('products.book_info', book_id=book_id))
 
     review_form = ReviewForm()
 
@@ -132,7 +168,7 @@ def share_review(book_id:int):
 
 
         flash('Your review has been added!', 'success')
-        return redirect(url_for('books_bp.book_info', book_id=book_id))
+        return redirect(url_for('products.book_info', book_id=book_id))
 
     elif review_form.errors:
         flash(review_form.errors, category='danger')
@@ -0,0 +1,158 @@
+import re
+from bisect import bisect_left
+from threading import Lock
+
+from sqlalchemy import func, text
+
+from app.products.models import Book, book_search_vector
+
+"""
+Python file for full-text search over products.
+PostgreSQL uses the GIN index from book_search_vector(),
+other databases (SQLite) use an in-process inverted index with the same ranking rules
+"""
+
+# mirrors setweight() A/B/C in book_search_vector and ts_rank_cd default weights of A/B/C (1.0, 0.4, 0.2)
+FIELD_WEIGHTS = {
+    'title': 1.0,
+    'author': 0.4,
+    'description': 0.2,
+}
+
+
+def tokenize(value: str | None) -> list[str]:
+    """Split text into lowercase word tokens"""
+    if not value:
+        return []
+    return re.findall(r'\w+', value.lower())
+
+
+class InvertedIndex:
+    """
+    Inverted index: token -> {book_id: weight}.
+    All the query terms must match, the last term matches as a prefix (search as you type)
+    """
+
+    def __init__(self):
+        self.fingerprint = None
+        self._postings = {}
+        self._tokens = []
+        self._lock = Lock()
+
+    def build(self, rows, fingerprint):
+        """
+        Rebuild index from rows
+        :param rows: iterable of (id, title, author, description)
+        :param fingerprint: catalogue state the index was built from
+        """
+        postings = {}
+        for book_id, title, author, description in rows:
+            for field, value in (('title', title), ('author', author), ('description', description)):
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenize(value):
+                    book_weights = postings.setdefault(token, {})
+                    book_weights[book_id] = book_weights.get(book_id, 0) + weight
+
+        with self._lock:
+            self._postings = postings
+            self._tokens = sorted(postings)
+            self.fingerprint = fingerprint
+
+    def _prefix_postings(self, prefix: str) -> dict:
+        """Merge postings of all tokens starting with prefix"""
+        merged = {}
+        position = bisect_left(self._tokens, prefix)
+        while position < len(self._tokens) and self._tokens[position].startswith(prefix):
+            for book_id, weight in self._postings[self._tokens[position]].items():
+                merged[book_id] = merged.get(book_id, 0) + weight
+            position += 1
+        return merged
+
+    def search(self, terms: list[str]) -> list[int]:
+        """
+        Find products matching all the terms
+        :returns product ids ordered by rank (best first), then by id
+        """
+        if not terms:
+            return []
+
+        with self._lock:
+            term_postings = [self._postings.get(t, {}) for t in terms[:-1]]
+            term_postings.append(self._prefix_postings(terms[-1]))
+
+        term_postings.sort(key=len)
+        scores = dict(term_postings[0])
+        for postings in term_postings[1:]:
+            scores = {
+                book_id: score + postings[book_id]
+                for book_id, score in scores.items()
+                if book_id in postings
+            }
+            if not scores:
+                return []
+
+        return sorted(scores, key=lambda book_id: (-scores[book_id], book_id))
+
+
+_fallback_index = InvertedIndex()
+_fallback_lock = Lock()
+
+
+def build_tsquery(terms: list[str]) -> str:
+    """Build to_tsquery() input: all terms required, last one as prefix"""
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+def search_ids_postgres(db_session, terms: list[str], limit: int, offset: int) -> list[int]:
+    """Ranked full-text search using the GIN index"""
+
+    vector = book_search_vector()
+    ts_query = func.to_tsquery(text("'simple'::regconfig"), build_tsquery(terms))
+    rank = func.ts_rank_cd(vector, ts_query)
+
+    rows = (
+        db_session.query(Book.id)
+        .filter(vector.op('@@')(ts_query))
+        .order_by(rank.desc(), Book.id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return [row.id for row in rows]
+
+
+def search_ids_fallback(db_session, terms: list[str], limit: int, offset: int) -> list[int]:
+    """
+    Ranked search using in-process inverted index.
+    Index is rebuilt when the catalogue fingerprint (count, max id, last update) changes,
+    so edits of titles, authors and descriptions by other processes (e.g. sync_catalog) are picked up too
+    """
+    fingerprint = tuple(db_session.query(func.count(Book.id), func.max(Book.id), func.max(Book.updated_at)).one())
+
+    with _fallback_lock:
+        if _fallback_index.fingerprint != fingerprint:
+            rows = (
+                db_session.query(Book.id, Book.title, Book.author, Book.description)
+                .yield_per(1000)
+            )
+            _fallback_index.build(rows, fingerprint)
+
+    return _fallback_index.search(terms)[offset:offset + limit]
+
+
+def search_book_ids(db_session, query: str, limit: int, offset: int = 0) -> list[int]:
+    """
+    Search products by title, author or description
+    :param db_session: db session
+    :param query: string typed by user
+    :param limit: max number of ids to return
+    :param offset: number of ranked results to skip
+    :return: product ids, best match first
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    if db_session.get_bind().dialect.name == 'postgresql':
+        return search_ids_postgres(db_session, terms, limit, offset)
+    return search_ids_fallback(db_session, terms, limit, offset)
@@ -1,17 +1,30 @@
 from flask_login import current_user
 
-from sqlalchemy.orm import joinedload
+from datetime import datetime
 
-from app.database import session_scope
+from sqlalchemy import case, func, null, select, update
+from sqlalchemy.orm import joinedload
 
+from app.database import on_commit
 from app.products.models import Book, Review, Genre, Stock
-from app.common.services import book_to_dict, review_to_dict
-from config import BOOK_CATEGORIES
+from app.order.models import CartItem
+from app.common.cache import TTLCache
+from app.products.fragments import bump_book_version
+from app.products.search import search_book_ids
+from app.products.catalog_snapshot import get_catalog_snapshot, page_of_ids, snapshot_version_columns, \
+    snapshot_version_due, remember_snapshot_version
+from app.products.facets import facet_criteria
+from app.common.services import book_to_dict, review_to_dict, book_card_columns, to_book_cards, BookCard, \
+    get_cart_quantity_guest
+from config import settings, BOOK_CATEGORIES, CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE, CATALOG_COUNT_TTL, \
+    SEARCH_PAGE_SIZE, SEARCH_MAX_RESULTS
 
 """
 Python file for product(products) supporting functions
 """
 
+_catalog_count_cache = TTLCache(ttl=CATALOG_COUNT_TTL)
+
 
 def format_top_books(raw_books):
     """Convert top products to dict"""
@@ -20,17 +33,17 @@ def format_top_books(raw_books):
 
 def filter_books_by_category(session, category:str):
     """
-    Returns Query with products from selected category
+    Returns Query with products from selected category, projected to BookCard columns
     If category == 'All', returns all the products
     """
-    books_query = session.query(Book).options(joinedload(Book.genres))
+    books_query = session.query(*book_card_columns())
 
     if not category or category == 'All':
         return books_query
 
     genres_in_category = BOOK_CATEGORIES.get(category, [])
     if genres_in_category:
-        books_query = books_query.join(Book.genres).filter(Genre.name.in_(genres_in_category))
+        books_query = books_query.filter(Book.genres.any(Genre.name.in_(genres_in_category)))
 
     return books_query
 
@@ -39,10 +52,108 @@ def filter_books_by_genre(query, genre_name:str):
     Returns products filtered by selected genre
     """
     if genre_name:
-        query = query.join(Book.genres).filter(Genre.name == genre_name)
+        query = query.filter(Book.genres.any(Genre.name == genre_name))
     return query
 
 
+def paginate_books(query, after: int | None = None, before: int | None = None,
+                   per_page: int = CATALOG_PAGE_SIZE) -> dict:
+    """
+    Keyset (seek) pagination of a products query, ordered by Book.id.
+    Only one page of rows (+1 to detect the next page) is fetched from database
+    :param query: Query with products, e.g. from filter_books_by_category
+    :param after: cursor, return products with id greater than {after}
+    :param before: cursor, return products with id less than {before}
+    :param per_page: page size, clamped to CATALOG_MAX_PAGE_SIZE
+    :returns dict with books (list of BookCard), next_cursor, prev_cursor, per_page
+    """
+    per_page = max(1, min(per_page or CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE))
+
+    if before is not None:
+        rows = (query.filter(Book.id < before)
+                .order_by(Book.id.desc())
+                .limit(per_page + 1)
+                .all())
+        has_prev = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(Book.id > after)
+        rows = query.order_by(Book.id).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    return book_page(to_book_cards(rows), has_prev, has_next, per_page)
+
+
+def book_page(books: list[BookCard], has_prev: bool, has_next: bool, per_page: int) -> dict:
+    """Page dict of paginate_books: books with cursors of the neighbour pages"""
+    return {
+        'books': books,
+        'next_cursor': books[-1].id if books and has_next else None,
+        'prev_cursor': books[0].id if books and has_prev else None,
+        'per_page': per_page,
+    }
+
+
+def count_books(query, category: str | None, genre_name: str | None, filters: dict[str, str] | None = None) -> int:
+    """
+    Count products for category/genre/facet bands.
+    Counts are cached for CATALOG_COUNT_TTL seconds, so catalog pages don't run COUNT on every hit
+    """
+    key = (category or 'All', genre_name or '', tuple(sorted((filters or {}).items())))
+    return _catalog_count_cache.get_or_set(key, lambda: query.order_by(None).count())
+
+
+def get_catalog_page(db_session, category: str | None, genre_name: str | None, after: int | None = None,
+                     before: int | None = None, per_page: int | None = None,
+                     filters: dict[str, str] | None = None) -> dict:
+    """
+    Catalogue page of products in category and genre.
+    With CATALOG_SNAPSHOT_ENABLED, ids of the page come from the in-process catalogue snapshot
+    and only the page rows are queried, otherwise (or with facet bands selected) see paginate_books
+    :param filters: selected facet bands, see parse_facet_filters
+    :returns page dict from paginate_books
+    """
+    if filters or not settings.CATALOG_SNAPSHOT_ENABLED:
+        return paginate_books(catalog_query(db_session, category, genre_name, filters), after, before, per_page)
+
+    per_page = max(1, min(per_page or CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE))
+    ids = get_catalog_snapshot(db_session).resolve(category, genre_name)
+    page_ids, has_prev, has_next = page_of_ids(ids, after, before, per_page)
+
+    books = []
+    if page_ids:
+        books = to_book_cards(
+            db_session.query(*book_card_columns())
+            .filter(Book.id.in_(page_ids.tolist()))
+            .order_by(Book.id)
+            .all()
+        )
+
+    return book_page(books, has_prev, has_next, per_page)
+
+
+def count_catalog(db_session, category: str | None, genre_name: str | None,
+                  filters: dict[str, str] | None = None) -> int:
+    """
+    Total count of products in category, genre and facet bands: size of the snapshot's id array
+    with CATALOG_SNAPSHOT_ENABLED and no bands selected, otherwise see count_books.
+    Catalogue pages take the total from their facet counts instead (see count_facets)
+    """
+    if filters or not settings.CATALOG_SNAPSHOT_ENABLED:
+        return count_books(catalog_query(db_session, category, genre_name, filters), category, genre_name, filters)
+    return len(get_catalog_snapshot(db_session).resolve(category, genre_name))
+
+
+def catalog_query(db_session, category: str | None, genre_name: str | None, filters: dict[str, str] | None):
+    """Query of products in category, genre and facet bands"""
+    books_query = filter_books_by_genre(filter_books_by_category(db_session, category), genre_name)
+    return books_query.filter(*facet_criteria(filters))
+
+
 def check_stock(db_session, book_id:int) -> int:
     """
     Function to check how many products are in stock
@@ -54,7 +165,54 @@ def check_stock(db_session, book_id:int) -> int:
     return stock.quantity if stock else 0
 
 
-def get_book(db_session, book_id:int) -> dict:
+def get_book_availability(db_session, book_id: int) -> tuple[int, int, datetime | None]:
+    """
+    Dynamic part of book page: copies in stock, copies in current user's cart
+    and the last change of book, stock or reviews, one query
+    :returns (stock quantity, quantity in cart, last modified)
+    """
+    stock_query = select(Stock.quantity).where(Stock.book_id == book_id).scalar_subquery()
+    modified_query = select(Book.updated_at).where(Book.id == book_id).scalar_subquery()
+    stock_modified_query = select(Stock.updated_at).where(Stock.book_id == book_id).scalar_subquery()
+    review_modified_query = select(func.max(Review.updated_at)).where(Review.book_id == book_id).scalar_subquery()
+
+    if current_user.is_authenticated:
+        cart_query = (
+            select(CartItem.quantity)
+            .where(CartItem.user_id == current_user.id, CartItem.book_id == book_id)
+            .scalar_subquery()
+        )
+    else:
+        cart_query = null()
+
+    stock, qty_in_cart, *modified = db_session.execute(
+        select(stock_query, cart_query, modified_query, stock_modified_query, review_modified_query)
+    ).one()
+
+    if not current_user.is_authenticated:
+        qty_in_cart = get_cart_quantity_guest(book_id)
+
+    modified = [m for m in modified if m is not None]
+
+    return stock or 0, qty_in_cart or 0, max(modified) if modified else None
+
+
+def get_catalog_version(db_session) -> datetime | None:
+    """
+    Last change of any product, used as ETag / Last-Modified of catalogue and search pages.
+    With CATALOG_SNAPSHOT_ENABLED the snapshot version check rides along when it's due, no extra query
+    """
+    if settings.CATALOG_SNAPSHOT_ENABLED and snapshot_version_due():
+        updated_at, *snapshot_version = db_session.execute(
+            select(func.max(Book.updated_at), *snapshot_version_columns())
+        ).one()
+        remember_snapshot_version(snapshot_version)
+        return updated_at
+
+    return db_session.execute(select(func.max(Book.updated_at))).scalar()
+
+
+def get_book(db_session, book_id:int) -> dict | None:
     """
     Get book information in dict format from database. Used for UI
     """
@@ -64,6 +222,9 @@ def get_book(db_session, book_id:int) -> dict:
         .filter(Book.id == book_id)
         .first()
     )
+    if book_obj is None:
+        return None
+
     book = book_to_dict(book_obj)
 
     return book
@@ -84,6 +245,7 @@ def get_reviews(db_session, book_id) -> list[dict]:
 def add_review_score(db_session, book_id: int, user_id: int, score: float, review_text: str | None = None):
     """Add review to database and update the book's rating"""
 
+    score = float(score)
     review = Review(
         user_id=user_id,
         book_id=book_id,
@@ -91,61 +253,115 @@ def add_review_score(db_session, book_id: int, user_id: int, score: float, revie
         review=review_text
     )
     db_session.add(review)
-    db_session.flush()
 
     recalculate_rating(db_session, book_id, score)
+    on_commit(db_session, lambda: bump_book_version(book_id))
+
 
-    db_session.commit()
+def average_rating(rating_sum, rating_count, catalog_rating):
+    """
+    SQL expression of a book's rating: average of review scores with the catalogue rating as one more score,
+    NULL without both. The only rating rule, used by reviews, rebuild_ratings and catalogue sync
+    """
+    catalog_count = case((catalog_rating.is_(None), 0), else_=1)
+    return case(
+        (rating_count + catalog_count == 0, null()),
+        else_=(rating_sum + func.coalesce(catalog_rating, 0)) / (rating_count + catalog_count)
+    )
 
 
 def recalculate_rating(db_session, book_id: int, new_score: float):
     """
-    Recalculate book rating based on new reviews.
+    Add a new review score to book rating with one atomic UPDATE,
+    safe for concurrent reviews (no read-modify-write in Python).
     :param db_session: database session
     :param book_id
     :param new_score: score from a new review
     """
-    book = db_session.query(Book).filter(Book.id == book_id).first()
+    rating_sum = Book.rating_sum + new_score
+    rating_count = Book.rating_count + 1
+
+    db_session.query(Book).filter(Book.id == book_id).update(
+        {
+            Book.rating_sum: rating_sum,
+            Book.rating_count: rating_count,
+            Book.rating: average_rating(rating_sum, rating_count, Book.catalog_rating),
+        },
+        synchronize_session=False
+    )
 
-    if book.rating is None:
-        book.rating = new_score
-        book.rating_count = 1
-    else:
-        total_score = book.rating * book.rating_count
-        total_score += new_score
-        book.rating_count += 1
-        book.rating = total_score / book.rating_count
 
+def rebuild_ratings(db_session) -> int:
+    """
+    Recalculate rating aggregates of all products from reviews in one GROUP BY pass,
+    ratings follow average_rating as in recalculate_rating
+    :returns number of rated products
+    """
+    aggregates = (
+        db_session.query(
+            Review.book_id.label('book_id'),
+            func.sum(Review.score).label('rating_sum'),
+            func.count(Review.id).label('rating_count'),
+        )
+        .filter(Review.score.isnot(None))
+        .group_by(Review.book_id)
+        .subquery()
+    )
+
+    result = db_session.execute(
+        update(Book)
+        .where(Book.id == aggregates.c.book_id)
+        .values(
+            rating_sum=aggregates.c.rating_sum,
+            rating_count=aggregates.c.rating_count,
+            rating=average_rating(aggregates.c.rating_sum, aggregates.c.rating_count, Book.catalog_rating),
+        )
+    )
+
+    db_session.execute(
+        update(Book)
+        .where(Book.rating_count != 0)
+        .where(~Book.id.in_(select(aggregates.c.book_id)))
+        .values(rating_sum=0, rating_count=0, rating=Book.catalog_rating)
+    )
 
-def check_existing_review(book_id: int) -> dict|None:
+    return result.rowcount
+
+
+def check_existing_review(db_session, book_id: int) -> dict|None:
     """
     Check if review is there is an existing review with current book_id  for current_user
     """
-    with session_scope() as db_session:
-        existing_review = db_session.query(Review).filter_by(
-            book_id=book_id,
-            user_id=current_user.id
-        ).first()
+    existing_review = db_session.query(Review).filter_by(
+        book_id=book_id,
+        user_id=current_user.id
+    ).first()
 
     return existing_review
 
 
-def search_books(db_session, query: str) -> list[dict]:
+def search_books(db_session, query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> list[BookCard]:
     """
-    Search products by title or author
+    Search products by title, author or description, best matches first
     :param db_session: db session
     :param query: string typed by auth
-    :return: list of dicts with filtered products
+    :param limit: page size
+    :param offset: number of results to skip, results stop at SEARCH_MAX_RESULTS
+    :return: list of BookCard with filtered products
     """
-    search_term = f"%{query}%"
-    books = (
-        db_session.query(Book)
-        .filter(
-            (Book.title.ilike(search_term)) |
-            (Book.author.ilike(search_term))
-        )
+    limit = max(0, min(limit, SEARCH_MAX_RESULTS - offset))
+    if not limit:
+        return []
+
+    book_ids = search_book_ids(db_session, query, limit=limit, offset=offset)
+    if not book_ids:
+        return []
+
+    books = to_book_cards(
+        db_session.query(*book_card_columns())
+        .filter(Book.id.in_(book_ids))
         .all()
     )
-    return [book_to_dict(book) for book in books]
-
+    book_map = {b.id: b for b in books}
 
+    return [book_map[book_id] for book_id in book_ids if book_id in book_map]
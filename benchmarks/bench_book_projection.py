@@ -0,0 +1,114 @@
+"""
+Benchmark: listing page read path.
+Compares full ORM hydration + book_to_dict (old catalogue path)
+with the column-projected BookCard read model.
+
+Runs against a throwaway in-memory SQLite database:
+$ python -m benchmarks.bench_book_projection --books 20000 --page 24 --repeat 20
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('APP_PORT', '5000')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, selectinload
+
+from app.database import Base
+from app.products.models import Book, Genre
+from app.common.services import book_to_dict, book_card_columns, to_book_cards
+import app.order.models  # noqa: F401, registers remaining tables
+import app.auth.models  # noqa: F401
+
+
+def seed(session, books_count: int):
+    """Fill database with synthetic books"""
+    genres = [Genre(name=f'Genre {i}') for i in range(20)]
+    session.add_all(genres)
+    session.flush()
+
+    for i in range(books_count):
+        session.add(Book(
+            title=f'Book title {i}',
+            author=f'Author {i % 500}',
+            year=1950 + i % 70,
+            price=round(random.uniform(5, 60), 2),
+            rating=round(random.uniform(1, 5), 1),
+            cover='img/book_cover1.jpg',
+            description='Lorem ipsum dolor sit amet. ' * 40,
+            genres=random.sample(genres, 2),
+        ))
+    session.commit()
+
+
+def orm_path(session, limit: int) -> list:
+    books = (session.query(Book)
+             .options(selectinload(Book.genres))
+             .order_by(Book.id)
+             .limit(limit)
+             .all())
+    return [book_to_dict(b) for b in books]
+
+
+def projection_path(session, limit: int) -> list:
+    rows = (session.query(*book_card_columns())
+            .order_by(Book.id)
+            .limit(limit)
+            .all())
+    return to_book_cards(rows)
+
+
+def measure(session_factory, path, limit: int, repeat: int) -> dict:
+    """Best wall time and peak allocated memory of {path}, fresh session per run"""
+    timings = []
+    for _ in range(repeat):
+        session = session_factory()
+        started = time.perf_counter()
+        path(session, limit)
+        timings.append(time.perf_counter() - started)
+        session.close()
+
+    session = session_factory()
+    tracemalloc.start()
+    result = path(session, limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.close()
+
+    return {
+        'rows': len(result),
+        'best_ms': min(timings) * 1000,
+        'median_ms': sorted(timings)[len(timings) // 2] * 1000,
+        'peak_kb': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=20000, help='books in synthetic catalogue')
+    parser.add_argument('--page', type=int, nargs='+', default=[24, 1000, 20000], help='rows per listing')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    with session_factory() as session:
+        seed(session, args.books)
+
+    print(f'{"rows":>8} {"path":>12} {"best ms":>10} {"median ms":>10} {"peak KB":>10}')
+    for limit in args.page:
+        for name, path in (('orm+dict', orm_path), ('projection', projection_path)):
+            stats = measure(session_factory, path, limit, args.repeat)
+            print(f'{stats["rows"]:>8} {name:>12} {stats["best_ms"]:>10.2f} '
+                  f'{stats["median_ms"]:>10.2f} {stats["peak_kb"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
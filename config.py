@@ -5,6 +5,40 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     APP_PORT: int
     DEBUG: bool = False
+    QUERY_BUDGET_ASSERT: bool = False
+    METRICS_ENABLED: bool = False
+
+    # connection pool, PostgreSQL only
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = True
+    DB_PGBOUNCER: bool = False  # NullPool, no prepared statements
+
+    # current_user cache: per-process LRU with TTL, optionally backed by shared redis
+    USER_CACHE_TTL: int = 300  # seconds in the shared cache, per-process copies expire sooner
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_URL: str | None = None  # redis://..., requires `redis` package
+
+    # book page fragments: per-process cache, version counters optionally shared via redis
+    FRAGMENT_CACHE_URL: str | None = None  # redis://..., requires `redis` package
+
+    # server-side sessions, cookie carries only a signed id. None -> signed cookie sessions
+    SESSION_STORE_URL: str | None = None  # local | file:///path | redis://...
+    SESSION_STORE_SIZE: int = 100000  # max sessions kept by `local` store
+
+    # per-request timings: Server-Timing header, histograms on /metrics, sampled profiles
+    INSTRUMENTATION_ENABLED: bool = False
+    PROFILE_SAMPLE_RATE: float = 0.0  # share of requests profiled, e.g. 0.01
+    PROFILE_DIR: str = 'profiles'
+
+    # catalogue pages resolve category / genre filters from an in-process snapshot of book ids
+    CATALOG_SNAPSHOT_ENABLED: bool = False
+
+    # async read views (home, catalogue, search, book page, API reads) over AsyncSession
+    ASYNC_READS_ENABLED: bool = False  # requires asyncpg / psycopg3 / aiosqlite, see requirements-async.txt
+    ASYNC_DATABASE_URL: str | None = None  # default: DATABASE_URL with the async driver
 
     class Config:
         env_file = ".env"
@@ -20,6 +54,51 @@ BOOK_CATEGORIES = {
     'Comics & Mangas': ['Comics', 'Manga'],
 }
 
+USER_CACHE_LOCAL_TTL = 10  # seconds, per-process copies of cached users
+
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 96
+CATALOG_COUNT_TTL = 60  # seconds
+CATALOG_SNAPSHOT_TTL = 3600  # seconds, snapshot is rebuilt at least this often
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 5  # seconds between checks of the products / genres version in the database
+
+# catalogue facets: band key -> (label, min inclusive, max exclusive), None is an open end
+# price bands are close to quartiles of book_catalog_sample.csv prices ($300 - $1480)
+PRICE_BANDS = {
+    'under-600': ('Under $600', None, 600),
+    '600-900': ('$600 - $900', 600, 900),
+    '900-1200': ('$900 - $1200', 900, 1200),
+    '1200-plus': ('$1200 and more', 1200, None),
+}
+YEAR_BANDS = {
+    'before-1950': ('Before 1950', None, 1950),
+    '1950-1999': ('1950 - 1999', 1950, 2000),
+    '2000-2014': ('2000 - 2014', 2000, 2015),
+    '2015-plus': ('2015 and newer', 2015, None),
+}
+RATING_BUCKETS = {
+    '4-plus': ('4 and up', 4, None),
+    '3-4': ('3 - 4', 3, 4),
+    '2-3': ('2 - 3', 2, 3),
+    'under-2': ('Under 2', None, 2),
+}
+
+SEARCH_PAGE_SIZE = 24
+SEARCH_MAX_RESULTS = 480
+
+TOP_BOOKS_LIMIT = 3
+TOP_BOOKS_TTL = 300  # seconds
+
+BOOK_FRAGMENT_TTL = 600  # seconds
+BOOK_FRAGMENT_LOCAL_TTL = 10  # seconds, without FRAGMENT_CACHE_URL
+BOOK_FRAGMENT_CACHE_SIZE = 2000
+
+# Cache-Control max-age of pages for anonymous users, pages of logged-in users are always revalidated
+HOME_MAX_AGE = 60  # seconds
+CATALOG_MAX_AGE = 60  # seconds
+
+API_COMPRESS_MIN_SIZE = 1024  # bytes, smaller JSON responses are sent uncompressed
+
 
 PICKUP_STORES = [
 ('', 'Select pickup location'),
@@ -0,0 +1,93 @@
+"""initial schema
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-18
+
+Schema previously created by Base.metadata.create_all().
+Existing databases are stamped with this revision by init_db()
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String(80), unique=True),
+        sa.Column('email', sa.String(120), unique=True),
+        sa.Column('phone', sa.String(80), unique=True),
+        sa.Column('password_hash', sa.String(256)),
+    )
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('title', sa.String(500), nullable=False),
+        sa.Column('author', sa.String(300), nullable=False),
+        sa.Column('year', sa.Integer()),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('rating', sa.Float()),
+        sa.Column('cover', sa.String(500)),
+        sa.Column('description', sa.Text()),
+    )
+    op.create_table(
+        'genres',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), unique=True, nullable=False),
+    )
+    op.create_table(
+        'book_genre',
+        sa.Column('book_id', sa.Integer(), sa.ForeignKey('products.id'), primary_key=True),
+        sa.Column('genre_id', sa.Integer(), sa.ForeignKey('genres.id'), primary_key=True),
+    )
+    op.create_table(
+        'stock',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('book_id', sa.Integer(), sa.ForeignKey('products.id'), unique=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'reviews',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+        sa.Column('book_id', sa.Integer(), sa.ForeignKey('products.id')),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('score', sa.Float()),
+        sa.Column('review', sa.Text()),
+    )
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+        sa.Column('date', sa.DateTime()),
+        sa.Column('status', sa.String(50)),
+        sa.Column('address', sa.String()),
+    )
+    op.create_table(
+        'order_items',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('order_id', sa.Integer(), sa.ForeignKey('orders.id')),
+        sa.Column('book_id', sa.Integer(), sa.ForeignKey('products.id')),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'cart_items',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+        sa.Column('book_id', sa.Integer(), sa.ForeignKey('products.id')),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    for table in ('cart_items', 'order_items', 'orders', 'reviews', 'stock',
+                  'book_genre', 'genres', 'products', 'users'):
+        op.drop_table(table)
@@ -0,0 +1,79 @@
+"""catalogue read models: sales leaderboard, rating aggregates, search index, supplier sync
+
+Revision ID: 0002_catalog_read_models
+Revises: 0001_initial
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002_catalog_read_models'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+# must match app.products.models.book_search_vector()
+SEARCH_VECTOR = (
+    "((setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(author, '')), 'B')) || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'C'))"
+)
+
+
+def upgrade():
+    op.create_table(
+        'book_sales',
+        sa.Column('book_id', sa.Integer(), sa.ForeignKey('products.id'), primary_key=True),
+        sa.Column('sales_count', sa.Integer(), nullable=False),
+    )
+    op.execute(
+        'INSERT INTO book_sales (book_id, sales_count) '
+        'SELECT book_id, SUM(quantity) FROM order_items '
+        'WHERE book_id IS NOT NULL GROUP BY book_id'
+    )
+
+    op.add_column('products', sa.Column('catalog_rating', sa.Float()))
+    op.add_column('products', sa.Column('rating_sum', sa.Float(), nullable=False, server_default='0'))
+    op.add_column('products', sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'))
+    # rating of books with reviews was overwritten by them, the catalogue rating is known only without reviews
+    op.execute(
+        'UPDATE products SET catalog_rating = rating '
+        'WHERE NOT EXISTS (SELECT 1 FROM reviews WHERE reviews.book_id = products.id AND score IS NOT NULL)'
+    )
+    op.execute(
+        'UPDATE products SET '
+        'rating_sum = (SELECT SUM(score) FROM reviews WHERE reviews.book_id = products.id AND score IS NOT NULL), '
+        'rating_count = (SELECT COUNT(id) FROM reviews WHERE reviews.book_id = products.id AND score IS NOT NULL), '
+        'rating = (SELECT AVG(score) FROM reviews WHERE reviews.book_id = products.id AND score IS NOT NULL) '
+        'WHERE EXISTS (SELECT 1 FROM reviews WHERE reviews.book_id = products.id AND score IS NOT NULL)'
+    )
+
+    op.add_column('products', sa.Column('sku', sa.String(64)))
+    op.add_column('products', sa.Column('content_hash', sa.String(32)))
+    op.create_index('ix_products_sku', 'products', ['sku'], unique=True)
+
+    op.create_table(
+        'catalog_imports',
+        sa.Column('source', sa.String(500), primary_key=True),
+        sa.Column('rows_done', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f'CREATE INDEX ix_products_search ON products USING gin ({SEARCH_VECTOR})')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_products_search', table_name='products')
+
+    op.drop_table('catalog_imports')
+    op.drop_index('ix_products_sku', table_name='products')
+    with op.batch_alter_table('products') as batch:
+        batch.drop_column('content_hash')
+        batch.drop_column('sku')
+        batch.drop_column('rating_count')
+        batch.drop_column('catalog_rating')
+        batch.drop_column('rating_sum')
+    op.drop_table('book_sales')
@@ -0,0 +1,48 @@
+"""indexes for hot query paths, one cart row per user and book
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_catalog_read_models
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = '0003_hot_path_indexes'
+down_revision = '0002_catalog_read_models'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # merge duplicated cart rows before adding the unique constraint
+    op.execute(
+        'UPDATE cart_items SET quantity = ('
+        '    SELECT SUM(c2.quantity) FROM cart_items c2'
+        '    WHERE c2.user_id = cart_items.user_id AND c2.book_id = cart_items.book_id'
+        ') WHERE id IN ('
+        '    SELECT MIN(id) FROM cart_items GROUP BY user_id, book_id HAVING COUNT(*) > 1'
+        ')'
+    )
+    op.execute(
+        'DELETE FROM cart_items WHERE id NOT IN ('
+        '    SELECT MIN(id) FROM cart_items GROUP BY user_id, book_id'
+        ')'
+    )
+    with op.batch_alter_table('cart_items') as batch:
+        batch.create_unique_constraint('uq_cart_items_user_book', ['user_id', 'book_id'])
+
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'])
+    op.create_index('ix_order_items_book_id', 'order_items', ['book_id'])
+    op.create_index('ix_orders_user_status_date', 'orders', ['user_id', 'status', 'date'])
+    op.create_index('ix_reviews_book_created', 'reviews', ['book_id', 'created_at'])
+    op.create_index('ix_book_genre_genre_id', 'book_genre', ['genre_id'])
+
+
+def downgrade():
+    op.drop_index('ix_book_genre_genre_id', table_name='book_genre')
+    op.drop_index('ix_reviews_book_created', table_name='reviews')
+    op.drop_index('ix_orders_user_status_date', table_name='orders')
+    op.drop_index('ix_order_items_book_id', table_name='order_items')
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
+    with op.batch_alter_table('cart_items') as batch:
+        batch.drop_constraint('uq_cart_items_user_book', type_='unique')
@@ -0,0 +1,45 @@
+"""updated_at on products, stock and reviews for conditional HTTP responses
+
+Revision ID: 0004_updated_at
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004_updated_at'
+down_revision = '0003_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+TABLES = ['products', 'stock', 'reviews']
+
+
+def batch_alter_table(table: str):
+    # SQLite can't ALTER TABLE ADD COLUMN with CURRENT_TIMESTAMP default, copy the table instead
+    recreate = 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+    return op.batch_alter_table(table, recreate=recreate)
+
+
+def utc_now():
+    # naive UTC like datetime.utcnow(), now() on PostgreSQL is in the server's time zone
+    if op.get_bind().dialect.name == 'postgresql':
+        return sa.text("timezone('utc', now())")
+    return sa.text('CURRENT_TIMESTAMP')
+
+
+def upgrade():
+    for table in TABLES:
+        with batch_alter_table(table) as batch:
+            batch.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=utc_now()))
+
+    op.execute('UPDATE reviews SET updated_at = created_at WHERE created_at IS NOT NULL')
+    op.create_index('ix_products_updated_at', 'products', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_products_updated_at', table_name='products')
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column('updated_at')